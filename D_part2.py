@@ -1,6 +1,24 @@
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import redis
-from pymongo import MongoClient
+from requests.adapters import HTTPAdapter
+from pymongo import MongoClient, ReplaceOne
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:  # only --snapshot needs pyarrow
+    ds = None
 
 # Constants
 BASE_URL = "http://127.0.0.1:5000"  #  API URL
@@ -8,57 +26,664 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 MONGO_URI = 'mongodb://localhost:27017/'
 DATABASE_NAME = 'university'
+PAGE_SIZE = 100  # records per API request
+MAX_WORKERS = 8  # concurrent page requests per endpoint
+REDIS_CHUNK_SIZE = 500  # records per Redis pipeline round trip
+MONGO_CHUNK_SIZE = 1000  # upserts per MongoDB bulk_write
+SYNC_STATE_FILE = 'sync_state.json'  # high-water mark of the last incremental sync
+PIPELINE_QUEUE_SIZE = 4  # pages buffered between the fetch stage and each store
 
 
 # Fetch data from APIs
-def fetch_data(api_endpoint):
-    data = []
-    page = 1
+def make_session(pool_size=MAX_WORKERS):
+    """Create a keep-alive HTTP session whose pool can serve every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_json(session, api_endpoint, params, base_url=BASE_URL):
+    """Request an endpoint and return its "data" object.
+
+    Raises RuntimeError on an HTTP error or the API's error envelope
+    ("code": 0), so a sync never skips a page without noticing.
+    """
+    response = session.get(f"{base_url}/{api_endpoint}", params=params)
+    payload = response.json() if response.status_code == 200 else {}
+    if payload.get("code") != 1:
+        error = payload.get("error") or response.text[:200]
+        raise RuntimeError(f"Error fetching {api_endpoint} {params}: HTTP {response.status_code} {error}")
+    return payload.get("data", {})
+
+
+def fetch_page(session, api_endpoint, page, page_size, base_url=BASE_URL, params=None):
+    """Fetch one page of an endpoint and return its "data" object (see fetch_json())."""
+    return fetch_json(session, api_endpoint, {**(params or {}), "page": page, "page_size": page_size}, base_url)
+
+
+def iter_pages(api_endpoint, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None, base_url=BASE_URL,
+               params=None):
+    """Yield the records of a paginated endpoint one page at a time, in page order.
+
+    The first page reveals `total`; the following pages are requested by at
+    most `max_workers` threads over one pooled session, never more than
+    `max_workers` pages ahead of the consumer, so memory does not grow with
+    the table. `params` are extra query parameters such as {"since": version}.
+    """
+    session = session or make_session(max_workers)
+    first = fetch_page(session, api_endpoint, 1, page_size, base_url, params)
+    yield first.get("records", [])
+    total = first.get("total")
+    if total is None:
+        # Endpoint does not report a total: walk pages until one comes back empty
+        for page in itertools.count(2):
+            records = fetch_page(session, api_endpoint, page, page_size, base_url, params).get("records", [])
+            if not records:
+                return
+            yield records
+
+    pages = iter(range(2, max(1, math.ceil(total / page_size)) + 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def request(page):
+            return executor.submit(fetch_page, session, api_endpoint, page, page_size, base_url, params)
+
+        pending = deque(request(page) for page in itertools.islice(pages, max_workers))
+        while pending:
+            page_data = pending.popleft().result()
+            next_page = next(pages, None)
+            if next_page is not None:
+                pending.append(request(next_page))
+            yield page_data.get("records", [])
+
+
+def iter_cursor_pages(api_endpoint, page_size=PAGE_SIZE, session=None, base_url=BASE_URL, params=None):
+    """Yield the records of an endpoint one page at a time by following its keyset `next_cursor`.
+
+    Each page starts after the last key of the one before, so a row added
+    or deleted meanwhile cannot shift the pages and make another row be
+    skipped, as it can with page numbers. Pages are requested one by one.
+    """
+    session = session or make_session(1)
+    cursor = ""
     while True:
-        response = requests.get(f"{BASE_URL}/{api_endpoint}", params={"page": page, "page_size": 10})
-        if response.status_code != 200:
-            print(f"Error fetching {api_endpoint} data")
-            break
-        records = response.json().get("data", {}).get("records", [])
-        if not records:
-            break
-        data.extend(records)
-        page += 1
-    return data
+        data = fetch_json(session, api_endpoint, {**(params or {}), "cursor": cursor, "page_size": page_size},
+                          base_url)
+        if data.get("records"):
+            yield data["records"]
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return
+
+
+def fetch_data(api_endpoint, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, session=None, base_url=BASE_URL,
+               params=None):
+    """Fetch every record of a paginated endpoint into one list (see iter_pages())."""
+    return [record for records in iter_pages(api_endpoint, page_size, max_workers, session, base_url, params)
+            for record in records]
+
+
+def fetch_all(api_endpoints, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, base_url=BASE_URL, params=None,
+              session=None):
+    """Fetch several endpoints at once, sharing one session; returns {endpoint: records}."""
+    session = session or make_session(max_workers * len(api_endpoints))
+    with ThreadPoolExecutor(max_workers=len(api_endpoints)) as executor:
+        futures = {
+            endpoint: executor.submit(fetch_data, endpoint, page_size, max_workers, session, base_url, params)
+            for endpoint in api_endpoints
+        }
+        return {endpoint: future.result() for endpoint, future in futures.items()}
+
+# Natural key of each record type, shared by the Redis and MongoDB loaders
+RECORD_KEY_FIELDS = {
+    "students": "id",
+    "courses": "course_id",
+    "departments": "dept_name",
+}
+
+# API table name of each synced record type, as reported by /deletions
+SYNC_TABLES = {
+    "department": "departments",
+    "student": "students",
+    "course": "courses",
+}
+
+# Secondary indexes store_in_redis() keeps next to the records (see index_record()):
+# folder -> (field, parent folder): set idx:<parent>:<value>:<folder> of the records with that field value
+REDIS_SET_INDEXES = {
+    "students": ("dept_name", "departments"),
+    "courses": ("dept_name", "departments"),
+}
+# folder -> fields: sorted set idx:<folder>:<field> of the records scored by that field
+REDIS_SCORE_INDEXES = {
+    "students": ["tot_cred"],
+    "departments": ["budget"],
+}
+# folder -> {list field: (member field, score field)}: sorted set idx:<folder>:<key>:<list field>
+# of the items a record embeds, e.g. idx:departments:CompSci:instructors scored by salary;
+# the set idx:<folder> lists the records that have them
+REDIS_NESTED_INDEXES = {
+    "departments": {"instructors": ("id", "salary")},
+}
+
+# Fields query_mongodb() looks documents up by, indexed at load time
+MONGO_QUERY_INDEXES = {
+    "students": ["name"],
+    "courses": ["title"],
+}
+
 
 # ----------------Store data in Redis------------------------------
-def store_in_redis(redis_client, data, folder):
-    for record in data:
-        
-        if folder == "students":
-            key_name = record.get("id")
-        elif folder == "courses":
-            key_name = record.get("course_id")
-        elif folder == "departments":
-            key_name = record.get("dept_name")
+
+
+def encode_record(record):
+    """Flatten a record into a Redis hash: one JSON-encoded value per field."""
+    return {field: json.dumps(value) for field, value in record.items()}
+
+
+def decode_record(fields):
+    """Inverse of encode_record(); returns None for a missing key."""
+    if not fields:
+        return None
+    return {field: json.loads(value) for field, value in fields.items()}
+
+
+def set_index_key(parent, value, folder):
+    """Set of the `folder` keys whose record points at `parent:value`, e.g. idx:departments:CompSci:students."""
+    return f"idx:{parent}:{value}:{folder}"
+
+
+def score_index_key(folder, field):
+    """Sorted set of the `folder` keys scored by `field`, e.g. idx:students:tot_cred."""
+    return f"idx:{folder}:{field}"
+
+
+def read_set_index_values(redis_client, folder, keys):
+    """Current value of the set-index field of each `folder:key` record (None if absent), one round trip."""
+    field = REDIS_SET_INDEXES[folder][0]
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hget(f"{folder}:{key}", field)
+    return [None if value is None else json.loads(value) for value in pipe.execute()]
+
+
+def index_record(pipe, folder, key_name, record, old_value=None):
+    """Queue the index updates for one record replacing a record whose set-index field was `old_value`."""
+    if folder in REDIS_SET_INDEXES:
+        field, parent = REDIS_SET_INDEXES[folder]
+        value = record.get(field)
+        if old_value is not None and old_value != value:
+            pipe.srem(set_index_key(parent, old_value, folder), key_name)
+        if value is not None:
+            pipe.sadd(set_index_key(parent, value, folder), key_name)
+    for field in REDIS_SCORE_INDEXES.get(folder, []):
+        if record.get(field) is None:
+            pipe.zrem(score_index_key(folder, field), key_name)
         else:
-            continue
+            pipe.zadd(score_index_key(folder, field), {key_name: record[field]})
+    if folder in REDIS_NESTED_INDEXES:
+        pipe.sadd(f"idx:{folder}", key_name)  # whose nested indexes exist
+    for nested, (member_field, score_field) in REDIS_NESTED_INDEXES.get(folder, {}).items():
+        # The record carries the whole list, so the sorted set is rebuilt from it
+        key = set_index_key(folder, key_name, nested)
+        pipe.delete(key)
+        scores = {item[member_field]: item[score_field]
+                  for item in record.get(nested) or [] if item.get(score_field) is not None}
+        if scores:
+            pipe.zadd(key, scores)
+
+
+def write_redis_chunk(redis_client, records, folder, key_field, ttl=None):
+    old_values = [None] * len(records)
+    if folder in REDIS_SET_INDEXES:
+        old_values = read_set_index_values(redis_client, folder, [record[key_field] for record in records])
+    # MULTI/EXEC: a reader never sees a record without its index entries
+    pipe = redis_client.pipeline()
+    for record, old_value in zip(records, old_values):
+        key_name = record[key_field]
+        key = f"{folder}:{key_name}"
+        pipe.delete(key)
+        pipe.hset(key, mapping=encode_record(record))
+        if ttl:
+            pipe.expire(key, ttl)
+        index_record(pipe, folder, key_name, record, old_value)
+    pipe.execute()
 
-        if key_name:
-            redis_client.set(f"{folder}:{key_name}", str(record))
+
+def store_in_redis(redis_client, data, folder, chunk_size=REDIS_CHUNK_SIZE, ttl=None):
+    """Store each record as the hash `folder:key` and update its secondary indexes, `chunk_size` records at a time.
+
+    Existing keys are replaced and dropped from the index entries of their
+    old values. With `ttl` (seconds) every record expires; its index entries
+    stay behind, and the query helpers leave out keys whose record is gone.
+    """
+    key_field = RECORD_KEY_FIELDS.get(folder)
+    if key_field is None:
+        return
+    records = []
+    for record in data:
+        if not record.get(key_field):
+            continue
+        records.append(record)
+        if len(records) >= chunk_size:
+            write_redis_chunk(redis_client, records, folder, key_field, ttl)
+            records = []
+    if records:
+        write_redis_chunk(redis_client, records, folder, key_field, ttl)
 
 
 # ------------------------Store data in MongoDB------------------------------
-def store_in_mongodb(db, data, collection_name):
+def ensure_mongo_indexes(collection, collection_name):
+    """Create the unique key index and the lookup indexes of a collection."""
+    key_field = RECORD_KEY_FIELDS.get(collection_name)
+    if key_field:
+        collection.create_index(key_field, unique=True)
+    for field in MONGO_QUERY_INDEXES.get(collection_name, []):
+        collection.create_index(field)
+
+
+def store_in_mongodb(db, data, collection_name, chunk_size=MONGO_CHUNK_SIZE):
+    """Upsert records by their natural key so repeated runs replace instead of duplicate.
+
+    Writes go out as unordered bulk_write batches of `chunk_size` ReplaceOne ops.
+    """
     collection = db[collection_name]
-    collection.insert_many(data)
+    ensure_mongo_indexes(collection, collection_name)
+    key_field = RECORD_KEY_FIELDS.get(collection_name)
+    if key_field is None:
+        collection.insert_many(data)
+        return
+    operations = []
+    for record in data:
+        if record.get(key_field) is None:
+            continue
+        operations.append(ReplaceOne({key_field: record[key_field]}, record, upsert=True))
+        if len(operations) >= chunk_size:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+# ------------------------Incremental sync------------------------------
+def load_high_water_mark(path=SYNC_STATE_FILE):
+    """Row version the stores were last synced to, or 0 when they never were."""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f).get("version", 0)
+
+
+def save_high_water_mark(version, path=SYNC_STATE_FILE):
+    with open(path, "w") as f:
+        json.dump({"version": version}, f)
+
+
+def fetch_deletions(session, since, base_url=BASE_URL):
+    """Return (current version, {folder: [deleted keys]}) for the records deleted after `since`."""
+    response = session.get(f"{base_url}/deletions", params={"since": since})
+    data = response.json().get("data", {}) if response.status_code == 200 else {}
+    if "version" not in data:
+        raise RuntimeError(f"Error fetching deletions: {response.text}")
+    deleted = {}
+    for record in data["records"]:
+        folder = SYNC_TABLES.get(record["table"])
+        if folder:
+            deleted.setdefault(folder, []).append(record["key"][0])
+    return data["version"], deleted
+
+
+def delete_from_redis(redis_client, keys, folder, chunk_size=REDIS_CHUNK_SIZE):
+    """Delete the hashes `folder:key` and their index entries, `chunk_size` keys per round trip."""
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        pipe = redis_client.pipeline()
+        if folder in REDIS_SET_INDEXES:
+            parent = REDIS_SET_INDEXES[folder][1]
+            for key, old_value in zip(chunk, read_set_index_values(redis_client, folder, chunk)):
+                if old_value is not None:
+                    pipe.srem(set_index_key(parent, old_value, folder), key)
+        for field in REDIS_SCORE_INDEXES.get(folder, []):
+            pipe.zrem(score_index_key(folder, field), *chunk)
+        if folder in REDIS_NESTED_INDEXES:
+            pipe.srem(f"idx:{folder}", *chunk)
+        for nested in REDIS_NESTED_INDEXES.get(folder, {}):
+            pipe.delete(*(set_index_key(folder, key, nested) for key in chunk))
+        pipe.delete(*(f"{folder}:{key}" for key in chunk))
+        pipe.execute()
+
+
+def delete_from_mongodb(db, keys, collection_name, chunk_size=MONGO_CHUNK_SIZE):
+    """Delete the documents whose natural key is in `keys`."""
+    key_field = RECORD_KEY_FIELDS[collection_name]
+    for i in range(0, len(keys), chunk_size):
+        db[collection_name].delete_many({key_field: {"$in": keys[i:i + chunk_size]}})
+
+
+def apply_deletions(redis_client, db, deleted):
+    """Delete {folder: [keys]} from Redis and MongoDB."""
+    for folder, keys in deleted.items():
+        delete_from_redis(redis_client, keys, folder)
+        delete_from_mongodb(db, keys, folder)
+
+
+def store_changes(redis_client, db, records, deleted):
+    """Apply {folder: [deleted keys]} and then upsert {folder: [records]} in Redis and MongoDB."""
+    apply_deletions(redis_client, db, deleted)
+    for folder, folder_records in records.items():
+        store_in_redis(redis_client, folder_records, folder)
+        store_in_mongodb(db, folder_records, folder)
+        print(f"{folder}: {len(folder_records)} changed, {len(deleted.get(folder, []))} deleted")
+
+
+class StageStats:
+    """Records one pipeline stage handled, time spent working on them and time spent waiting on its queue."""
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.seconds = 0.0
+        self.waiting = 0.0
+
+    def __str__(self):
+        rate = self.records / self.seconds if self.seconds else 0
+        return (f"{self.name}: {self.records} records, {self.seconds:.2f}s busy ({rate:.0f} records/s), "
+                f"{self.waiting:.2f}s waiting")
+
+
+def _run_sink(name, sink, batches, stats, errors):
+    start = time.perf_counter()
+    finished = False
+
+    def records():
+        nonlocal finished
+        while True:
+            wait = time.perf_counter()
+            batch = batches.get()
+            stats.waiting += time.perf_counter() - wait
+            if batch is None:
+                finished = True
+                return
+            stats.records += len(batch)
+            yield from batch
+
+    try:
+        sink(records())
+    except Exception as e:
+        errors.append((f"storing in {name}", e))
+        # Keep draining up to the end marker, unless already read, so the source is never blocked
+        while not finished and batches.get() is not None:
+            pass
+    stats.seconds = time.perf_counter() - start - stats.waiting
+
+
+def run_pipeline(name, source, sinks, queue_size=PIPELINE_QUEUE_SIZE):
+    """Stream the batches of records `source` yields into every sink at once; returns the stage statistics.
+
+    `sinks` maps a stage name to a function consuming an iterable of
+    records. Each sink runs in its own thread behind a queue of at most
+    `queue_size` batches. A sink that falls behind fills its queue and the
+    source waits (backpressure), so memory stays bounded whatever the size
+    of the source, while fetching overlaps with writing. An error in the
+    source or in any sink is raised once every stage has stopped.
+    """
+    fetch = StageStats(f"{name} fetch")
+    stats = [fetch]
+    errors = []
+    threads = []
+    queues = []
+    for sink_name, sink in sinks.items():
+        batches = queue.Queue(maxsize=queue_size)
+        sink_stats = StageStats(f"{name} {sink_name}")
+        threads.append(threading.Thread(target=_run_sink, args=(sink_name, sink, batches, sink_stats, errors)))
+        queues.append(batches)
+        stats.append(sink_stats)
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    try:
+        for batch in source:
+            fetch.records += len(batch)
+            wait = time.perf_counter()
+            for batches in queues:
+                batches.put(batch)
+            fetch.waiting += time.perf_counter() - wait
+    except Exception as e:
+        errors.insert(0, ("fetching", e))
+    finally:
+        for batches in queues:
+            batches.put(None)
+        fetch.seconds = time.perf_counter() - start - fetch.waiting
+        for thread in threads:
+            thread.join()
+    if errors:
+        stage, error = errors[0]
+        raise RuntimeError(f"{name}: {stage} failed: {error}") from error
+    return stats
+
+
+def sync_stores(redis_client, db, since=0, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, base_url=BASE_URL,
+                stats=None):
+    """Bring Redis and MongoDB up to date with the API and return the new high-water mark.
+
+    Only records changed after row version `since` are fetched (0 fetches
+    everything). Deletes are applied before upserts, so a key deleted and
+    re-created in between ends up present. The version is read before the
+    records; a change committed meanwhile is fetched again next time.
+    Each endpoint streams page by page into both stores (run_pipeline()),
+    and the endpoints run concurrently. Pages are read by keyset cursor,
+    so a delete during the sync cannot make rows be skipped. Any failed
+    page raises, leaving the caller's high-water mark where it was.
+    If `stats` is a dict, each endpoint's stage statistics are put in it.
+    """
+    endpoints = list(RECORD_KEY_FIELDS)
+    session = make_session(max_workers * len(endpoints))
+    version, deleted = fetch_deletions(session, since, base_url)
+    apply_deletions(redis_client, db, deleted)
+    params = {"since": since} if since else None
+
+    def stream(folder):
+        pages = iter_cursor_pages(folder, page_size, session, base_url, params)
+        return run_pipeline(folder, pages, {
+            "redis": lambda records: store_in_redis(redis_client, records, folder),
+            "mongodb": lambda records: store_in_mongodb(db, records, folder),
+        })
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        for folder, stages in zip(endpoints, executor.map(stream, endpoints)):
+            print(f"{folder}: {stages[0].records} changed, {len(deleted.get(folder, []))} deleted")
+            for stage in stages:
+                print(f"    {stage}")
+            if stats is not None:
+                stats[folder] = stages
+    return version
+
+
+# ------------------------Ingest from a snapshot------------------------------
+def read_snapshot_table(snapshot_dir, manifest, table, columns, filter=None):
+    """Read the given columns of one snapshot table as a list of dicts.
+
+    Only the columns asked for are decoded, and with Parquet the `filter`
+    expression skips every row group whose statistics rule it out.
+    """
+    fmt = manifest["format"]
+    path = os.path.join(snapshot_dir, f"{table}.{fmt}")
+    dataset = ds.dataset(path, format="parquet" if fmt == "parquet" else "ipc")
+    return dataset.to_table(columns=columns, filter=filter).to_pylist()
+
+
+def group_rows(rows, key_field):
+    """Group rows by one field, keeping their order; returns {value: [rows]}."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key_field], []).append(row)
+    return groups
+
+
+def read_snapshot(snapshot_dir, since=0):
+    """Build the departments, students and courses records the API would return from a snapshot.
+
+    Returns (snapshot version, {folder: records}, {folder: deleted keys}).
+    With `since` only records changed after that row version are built: a
+    record's row version also moves when a row embedded in it changes, so
+    only the parents are filtered and their nested rows looked up by key.
+    """
+    if ds is None:
+        raise RuntimeError("--snapshot needs pyarrow (pip install pyarrow)")
+    with open(os.path.join(snapshot_dir, "snapshot.json")) as f:
+        manifest = json.load(f)
+    changed = ds.field("row_version") > since if since else None
+
+    def read(table, columns, filter=None):
+        return read_snapshot_table(snapshot_dir, manifest, table, columns, filter)
+
+    def read_children(table, columns, key_field, keys):
+        if since and not keys:
+            return {}
+        return group_rows(read(table, columns, ds.field(key_field).isin(keys) if since else None), key_field)
+
+    departments = read("department", ["dept_name", "building", "budget"], changed)
+    dept_names = [dept["dept_name"] for dept in departments]
+    instructors = read_children("instructor", ["id", "name", "salary", "dept_name"], "dept_name", dept_names)
+    dept_students = read_children("student", ["id", "name", "dept_name"], "dept_name", dept_names)
+    for dept in departments:
+        dept["instructors"] = [{"id": ins["id"], "name": ins["name"], "salary": ins["salary"]}
+                               for ins in instructors.get(dept["dept_name"], [])]
+        dept["students"] = [{"id": stu["id"], "name": stu["name"]}
+                            for stu in dept_students.get(dept["dept_name"], [])]
+
+    students = read("student", ["id", "name", "dept_name", "tot_cred"], changed)
+    takes = read_children("takes", ["student_id", "course_id", "sec_id", "semester", "year"], "student_id",
+                          [stu["id"] for stu in students])
+    for stu in students:
+        stu["courses"] = [{"course_id": take["course_id"], "section_id": take["sec_id"],
+                           "semester": take["semester"], "year": take["year"]}
+                          for take in takes.get(stu["id"], [])]
+
+    courses = read("course", ["course_id", "title", "dept_name", "credits"], changed)
+    course_ids = [course["course_id"] for course in courses]
+    sections = read_children("section", ["course_id"], "course_id", course_ids)
+    teaches = read_children("teaches", ["instructor_id", "course_id"], "course_id", course_ids)
+    instructor_ids = list({teach["instructor_id"] for rows in teaches.values() for teach in rows})
+    names = {ins["id"]: ins["name"] for rows in read_children("instructor", ["id", "name"], "id", instructor_ids).values()
+             for ins in rows}
+    for course in courses:
+        # Same shape as /courses: the course's teaches once per section of the course
+        course["instructors"] = [{"instructor_id": teach["instructor_id"], "name": names.get(teach["instructor_id"])}
+                                 for _ in sections.get(course["course_id"], [])
+                                 for teach in teaches.get(course["course_id"], [])]
+
+    deleted = {}
+    if since:
+        for record in read("deleted_record", ["table_name", "record_key"], ds.field("version") > since):
+            folder = SYNC_TABLES.get(record["table_name"])
+            if folder:
+                deleted.setdefault(folder, []).append(json.loads(record["record_key"])[0])
+    records = {"departments": departments, "students": students, "courses": courses}
+    return manifest["version"], records, deleted
+
+
+def sync_stores_from_snapshot(redis_client, db, snapshot_dir, since=0):
+    """Like sync_stores(), but reading a snapshot written by `flask snapshot` instead of the API."""
+    version, records, deleted = read_snapshot(snapshot_dir, since)
+    store_changes(redis_client, db, records, deleted)
+    return version
 
 
 #---------------------------- Query Redis---------------------------
+def fetch_from_redis(redis_client, keys, chunk_size=REDIS_CHUNK_SIZE):
+    """Look up many `folder:key` records in one pipelined round trip per `chunk_size` keys.
+
+    Records are hashes, which MGET cannot read, so the HGETALLs are pipelined.
+    Returns the decoded records in the order of `keys`, None for missing ones.
+    """
+    records = []
+    pipe = redis_client.pipeline(transaction=False)
+    for i in range(0, len(keys), chunk_size):
+        for key in keys[i:i + chunk_size]:
+            pipe.hgetall(key)
+        records.extend(decode_record(fields) for fields in pipe.execute())
+    return records
+
+
+def live_keys(redis_client, folder, keys):
+    """The keys whose `folder:key` record still exists, checked in one round trip.
+
+    A record stored with a TTL leaves its index entries behind when it
+    expires; the query helpers use this to leave those keys out.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(f"{folder}:{key}")
+    return [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+
+def members_from_redis(redis_client, dept_name, folder):
+    """Keys of the students, courses or instructors of a department, read from its index."""
+    key = set_index_key("departments", dept_name, folder)
+    if folder in REDIS_NESTED_INDEXES["departments"]:
+        # Instructors live inside the department record and expire with it
+        pipe = redis_client.pipeline(transaction=False)
+        members, exists = pipe.zrange(key, 0, -1).exists(f"departments:{dept_name}").execute()
+        return members if exists else []
+    return live_keys(redis_client, folder, sorted(redis_client.smembers(key)))
+
+
+def is_member_in_redis(redis_client, dept_name, folder, key):
+    """Whether student, course or instructor `key` belongs to a department, in one round trip."""
+    index = set_index_key("departments", dept_name, folder)
+    pipe = redis_client.pipeline(transaction=False)
+    if folder in REDIS_NESTED_INDEXES["departments"]:
+        score, exists = pipe.zscore(index, key).exists(f"departments:{dept_name}").execute()
+        return score is not None and bool(exists)
+    member, exists = pipe.sismember(index, key).exists(f"{folder}:{key}").execute()
+    return bool(member) and bool(exists)
+
+
+def range_from_redis(redis_client, folder, field, low="-inf", high="+inf", offset=None, count=None):
+    """(key, score) of the records whose `field` lies in [low, high], lowest first.
+
+    Bounds follow ZRANGEBYSCORE: "(100" excludes 100, so
+    range_from_redis(r, "students", "tot_cred", "(100") is tot_cred > 100.
+    `offset` and `count` apply to the index, so expired records left out
+    can make a page shorter than `count`.
+    """
+    hits = redis_client.zrangebyscore(score_index_key(folder, field), low, high,
+                                      start=offset, num=count, withscores=True)
+    live = set(live_keys(redis_client, folder, [key for key, _ in hits]))
+    return [(key, score) for key, score in hits if key in live]
+
+
+def instructors_by_salary_from_redis(redis_client, low="-inf", high="+inf"):
+    """(dept_name, instructor id, salary) of the instructors paid within [low, high], lowest first.
+
+    Salaries are indexed per department; the departments' ranges are read
+    in one pipelined round trip and merged.
+    """
+    dept_names = live_keys(redis_client, "departments", sorted(redis_client.smembers("idx:departments")))
+    pipe = redis_client.pipeline(transaction=False)
+    for dept_name in dept_names:
+        pipe.zrangebyscore(set_index_key("departments", dept_name, "instructors"), low, high, withscores=True)
+    ranges = [[(salary, dept_name, key) for key, salary in hits] for dept_name, hits in zip(dept_names, pipe.execute())]
+    return [(dept_name, key, salary) for salary, dept_name, key in heapq.merge(*ranges)]
+
+
 def query_redis(redis_client):
-    comp_sci_data = redis_client.get("departments:CompSci")
-    peter_lynch_data = redis_client.get("students:1999")
-    data_engineering_course = redis_client.get("courses:Data1050")
+    comp_sci_data, peter_lynch_data, data_engineering_course = fetch_from_redis(
+        redis_client, ["departments:CompSci", "students:1999", "courses:Data1050"]
+    )
+    comp_sci_students = members_from_redis(redis_client, "CompSci", "students")
+    senior_students = range_from_redis(redis_client, "students", "tot_cred", "(100")
 
     print("\n--- Redis Query Results ---")
     print("Computer Science Department:", comp_sci_data)
     print("Peter Lynch Data:", peter_lynch_data)
     print("Data Engineering Course:", data_engineering_course)
+    print("Students in CompSci:", comp_sci_students)
+    print("Peter Lynch is in CompSci:", is_member_in_redis(redis_client, "CompSci", "students", "1999"))
+    print("Students with more than 100 credits:", len(senior_students))
+    print("Instructors paid over 100000:", instructors_by_salary_from_redis(redis_client, "(100000"))
 
 
 # ---------Query MongoDB-----------------
@@ -83,25 +708,24 @@ def query_mongodb(db):
 
 # -------------Main Execution---------------------------
 if __name__ == "__main__":
-    # Fetch data from APIs
-    departments_data = fetch_data("departments")
-    students_data = fetch_data("students")
-    courses_data = fetch_data("courses")
+    parser = argparse.ArgumentParser(description="Copy departments, students and courses into Redis and MongoDB.")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only apply the changes since the last run (high-water mark in {SYNC_STATE_FILE})")
+    parser.add_argument("--snapshot", metavar="DIR",
+                        help="read a Parquet/Arrow snapshot directory (flask snapshot DIR) instead of the API")
+    args = parser.parse_args()
 
-    # Store data in Redis
     redis_client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    store_in_redis(redis_client, departments_data, "departments")
-    store_in_redis(redis_client, students_data, "students")
-    store_in_redis(redis_client, courses_data, "courses")
-    print("Data successfully stored in Redis!")
-
-    # Store data in MongoDB
     mongo_client = MongoClient(MONGO_URI)
     db = mongo_client[DATABASE_NAME]
-    store_in_mongodb(db, departments_data, "departments")
-    store_in_mongodb(db, students_data, "students")
-    store_in_mongodb(db, courses_data, "courses")
-    print("Data successfully stored in MongoDB!")
+
+    # Fetch data from the API and store it in Redis and MongoDB
+    since = load_high_water_mark() if args.incremental else 0
+    if args.snapshot:
+        save_high_water_mark(sync_stores_from_snapshot(redis_client, db, args.snapshot, since))
+    else:
+        save_high_water_mark(sync_stores(redis_client, db, since))
+    print("Data successfully stored in Redis and MongoDB!")
 
     # Query Redis
     query_redis(redis_client)
@@ -1,33 +1,445 @@
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from flask_sqlalchemy.session import Session
+from datetime import datetime, time as dtime
+import heapq
+import itertools
+import argparse
+import asyncio
+import base64
+import click
+import contextvars
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 import pandas as pd
-from flask import Flask, jsonify, request
+from flask import Flask, g, has_request_context, jsonify, request, stream_with_context
+from sqlalchemy import create_engine, event, func, inspect, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, load_only, query_expression, selectinload, with_expression
+from sqlalchemy.orm.attributes import InstrumentedAttribute
 
 
 # Flask application configuration
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///university_schema.db'  # SQLite database
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('UNIVERSITY_DATABASE_URI', 'sqlite:///university_schema.db')  # SQLite database
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Directory holding the source CSVs, overridable for other datasets
+app.config['DATA_DIR'] = os.environ.get('UNIVERSITY_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+app.config['CSV_CHUNK_SIZE'] = int(os.environ.get('UNIVERSITY_CSV_CHUNK_SIZE', 50000))
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('UNIVERSITY_RESPONSE_CACHE_SIZE', 256))  # cached responses
+app.config['STREAM_BATCH_SIZE'] = 1000  # rows per chunk of a ?stream=ndjson response
+app.config['MAX_MULTIGET_IDS'] = 1000  # keys per ?ids= request
+app.config['SEARCH_MAX_PAGE_SIZE'] = 100  # hits per /search page
+app.config['MAX_BULK_ROWS'] = 10000  # rows per bulk POST/PATCH request
+app.config['SNAPSHOT_BATCH_SIZE'] = 65536  # rows per Arrow record batch / Parquet row group
+# time_slot.csv writes afternoons on a 12-hour clock without a.m./p.m.:
+# bare hours before this one are read as p.m. ("1:00" -> 13:00)
+app.config['SLOT_PM_BEFORE_HOUR'] = 8
+# Log statements slower than this many seconds (unset: no slow-query log)
+app.config['SLOW_QUERY_SECONDS'] = float(os.environ['UNIVERSITY_SLOW_QUERY_SECONDS']) if os.environ.get('UNIVERSITY_SLOW_QUERY_SECONDS') else None
+
+# Engine profile: 'default' keeps SQLite's stock settings; 'production' turns on
+# the pragmas below and serves GET requests from read-only connections
+app.config['DB_PROFILE'] = os.environ.get('UNIVERSITY_DB_PROFILE', 'default')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('UNIVERSITY_DB_POOL_SIZE', 5))  # connections per worker process
+# ASGI mode: threads running views (so requests using the database at once), and how much of a
+# response a view thread produces before the rest is pulled one chunk at a time
+app.config['ASGI_WORKER_THREADS'] = int(os.environ.get('UNIVERSITY_ASGI_WORKER_THREADS', 2 * app.config['DB_POOL_SIZE']))
+app.config['ASGI_BUFFER_BYTES'] = 65536
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',  # readers no longer wait for a writer to commit
+    'synchronous': 'NORMAL',  # durable with WAL, without an fsync per commit
+    'cache_size': -65536,  # 64 MiB page cache per connection
+    'mmap_size': 268435456,  # read the database file through a 256 MiB mapping
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # milliseconds
+}
+if app.config['DB_PROFILE'] == 'production':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_POOL_SIZE'],
+    }
+
+
+class RoutingSession(Session):
+    """Session that sends the queries of GET requests to the read-only engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and request.method in ('GET', 'HEAD') and readonly_engine_enabled():
+            return get_readonly_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
 # Initialize SQLAlchemy
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+
+# -------------------------- ENGINE PROFILE --------------------------
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def _configure_writer_connection(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection, app.config['SQLITE_PRAGMAS'])
+
+
+def _configure_reader_connection(dbapi_connection, connection_record):
+    # journal_mode is a property of the file and is set by the writer
+    pragmas = {name: value for name, value in app.config['SQLITE_PRAGMAS'].items() if name != 'journal_mode'}
+    apply_sqlite_pragmas(dbapi_connection, {**pragmas, 'query_only': 'ON'})
+
+
+_readonly_engine = None
+_readonly_engine_lock = threading.Lock()
+
+
+def readonly_engine_enabled():
+    """Read-only connections are used by the production profile on a file database."""
+    if app.config['DB_PROFILE'] != 'production':
+        return False
+    url = db.engine.url
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
 
 
+def get_readonly_engine():
+    """Engine opening the same SQLite file with mode=ro, created on first use."""
+    global _readonly_engine
+    with _readonly_engine_lock:
+        if _readonly_engine is None:
+            engine = create_engine(
+                f"sqlite:///file:{db.engine.url.database}?mode=ro&uri=true",
+                pool_size=app.config['DB_POOL_SIZE'],
+                max_overflow=app.config['DB_POOL_SIZE'],
+            )
+            event.listen(engine, 'connect', _configure_reader_connection)
+            _readonly_engine = engine
+        return _readonly_engine
+
+
+def _reset_pools_after_fork():
+    # A forked WSGI worker must not reuse connections opened by its parent
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if _readonly_engine is not None:
+        _readonly_engine.dispose(close=False)
+
+
+if app.config['DB_PROFILE'] == 'production':
+    with app.app_context():
+        if db.engine.url.get_backend_name() == 'sqlite':
+            event.listen(db.engine, 'connect', _configure_writer_connection)
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+
+# Row counts of whole tables: table name -> (data version, count)
+_total_cache = {}
+
+
+def count_records(query):
+    """Count the rows matched by a query, caching unfiltered table counts."""
+    if query.whereclause is not None:
+        return query.order_by(None).count()
+    model = query.column_descriptions[0]['entity']
+    version = data_version()
+    cached = _total_cache.get(model.__tablename__)
+    if cached is None or cached[0] != version:
+        cached = (version, db.session.query(func.count()).select_from(model).scalar())
+        _total_cache[model.__tablename__] = cached
+    return cached[1]
+
+
+def positive_arg(name, default):
+    """Read a query argument such as ?page= or ?page_size= that must be a whole number of at least 1."""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number") from None
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1")
+    return value
+
 
 def paginate(query, page, page_size):
     """Paginate the query results."""
-    total_records = query.count()
+    total_records = count_records(query)
     records = query.offset((page - 1) * page_size).limit(page_size).all()
     return records, total_records
 
+
+def encode_cursor(values):
+    """Turn the key values of the last row on a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor()."""
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+
+def paginate_keyset(query, key_columns, cursor, page_size):
+    """Return the page after `cursor` by seeking on the key columns.
+
+    The cost does not depend on how deep the page is, unlike OFFSET.
+    next_cursor is None on the last page.
+    """
+    query = query.order_by(None).order_by(*key_columns)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(key_columns) == 1:
+            query = query.filter(key_columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*key_columns) > tuple_(*values))
+    records = query.limit(page_size + 1).all()
+    next_cursor = None
+    if len(records) > page_size:
+        records = records[:page_size]
+        next_cursor = encode_cursor([getattr(records[-1], col.key) for col in key_columns])
+    return records, next_cursor
+
+
+def fetch_page(query, key_columns):
+    """Paginate a query by `?cursor=` when given, otherwise by `?page=`.
+
+    Returns the records and the pagination fields of the response.
+    A ?ids= multi-get is not paginated, so every endpoint using this must
+    also restrict its query with filter_ids().
+    """
+    if 'ids' in request.args:
+        records = query.all()
+        return records, {"total": len(records)}
+    page_size = positive_arg('page_size', 10)
+    if 'cursor' in request.args:
+        records, next_cursor = paginate_keyset(query, key_columns, request.args['cursor'], page_size)
+        meta = {"page_size": page_size, "next_cursor": next_cursor}
+        if request.args.get('with_total') in ('1', 'true'):
+            meta["total"] = count_records(query)
+        return records, meta
+    page = positive_arg('page', 1)
+    records, total_records = paginate(query, page, page_size)
+    return records, {"total": total_records, "page": page, "page_size": page_size}
+
+
+def parse_ids(key_columns):
+    """Parse `?ids=`: comma-separated keys, the parts of a composite key joined by ':'."""
+    keys = []
+    for text in request.args['ids'].split(','):
+        if not text:
+            continue
+        parts = text.split(':', len(key_columns) - 1)
+        if len(parts) != len(key_columns):
+            raise ValueError(f"id {text!r} needs {len(key_columns)} parts: "
+                             f"{':'.join(column.key for column in key_columns)}")
+        keys.append(tuple(column.type.python_type(part) for column, part in zip(key_columns, parts)))
+    if len(keys) > app.config['MAX_MULTIGET_IDS']:
+        raise ValueError(f"at most {app.config['MAX_MULTIGET_IDS']} ids per request")
+    return keys
+
+
+def filter_ids(query, model):
+    """Restrict a query to the primary keys listed in `?ids=`, in one IN query.
+
+    A composite key is matched as a row value; the extra IN on its first
+    column lets SQLite seek the primary key index instead of scanning.
+    """
+    if 'ids' not in request.args:
+        return query
+    mapper = inspect(model)
+    key_columns = [getattr(model, mapper.get_property_by_column(column).key) for column in mapper.primary_key]
+    keys = parse_ids(key_columns)
+    if len(key_columns) == 1:
+        return query.filter(key_columns[0].in_([key[0] for key in keys]))
+    return query.filter(key_columns[0].in_({key[0] for key in keys}), tuple_(*key_columns).in_(keys))
+
+
+# -------------------------- RESPONSE CACHE --------------------------
+
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+# Bumped by invalidate_caches(), so a response computed before a clear is not stored after it
+_cache_generation = 0
+
+
+def data_version():
+    """Version of the data, read once per request: the last row version committed by any process.
+
+    Every write stamps a new row version in sync_state, so checking it (a
+    primary key lookup) keeps the caches of all worker processes current,
+    whichever process wrote.
+    """
+    if not has_request_context():
+        return current_row_version()
+    if 'data_version' not in g:
+        g.data_version = current_row_version()
+    return g.data_version
+
+
+@app.before_request
+def _reset_data_version():
+    # g outlives the request when an app context was pushed around it
+    g.pop('data_version', None)
+
+
+def invalidate_caches():
+    """Drop this process's cached counts and responses, e.g. after a rebuild reset the versions."""
+    global _cache_generation
+    with _response_cache_lock:
+        _cache_generation += 1
+        _response_cache.clear()
+        _total_cache.clear()
+
+
+def cached_response(view):
+    """Serve a GET view from an LRU cache keyed by path and query string.
+
+    Responses carry an ETag, and a matching If-None-Match gets a 304.
+    Only successful ("code": 1) responses are stored, and an entry is only
+    served while the data version it was computed at is still current.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        version = data_version()
+        with _response_cache_lock:
+            entry = _response_cache.get(key)
+            if entry is not None and entry[0] == version:
+                _response_cache.move_to_end(key)
+            else:
+                entry = None
+            generation = _cache_generation
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            payload = None
+            if response.status_code == 200 and not response.is_streamed:
+                payload = response.get_json(silent=True)
+            if not payload or payload.get("code") != 1:
+                return response
+            response.add_etag()
+            entry = (version, response.get_data(), response.mimetype, response.get_etag()[0])
+            with _response_cache_lock:
+                if generation == _cache_generation:
+                    _response_cache[key] = entry
+                    while len(_response_cache) > app.config['RESPONSE_CACHE_SIZE']:
+                        _response_cache.popitem(last=False)
+        response = app.response_class(entry[1], mimetype=entry[2])
+        response.set_etag(entry[3])
+        return response.make_conditional(request)
+    return wrapper
+
+# -------------------------- METRICS --------------------------
+
+class Histogram:
+    """Minimal Prometheus-style histogram with one series per route."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # route -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, route, value):
+        with self.lock:
+            series = self.series.setdefault(route, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for route, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{route="{route}",le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{route="{route}"}} {series[-2]}')
+                lines.append(f'{self.name}_count{{route="{route}"}} {series[-1]}')
+        return "\n".join(lines)
+
+
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+REQUEST_SECONDS = Histogram("university_request_seconds", "Total time spent handling a request.", SECONDS_BUCKETS)
+SQL_QUERIES = Histogram("university_request_sql_queries", "SQL statements executed per request.",
+                        [0, 1, 2, 5, 10, 25, 50, 100, 1000])
+SQL_SECONDS = Histogram("university_request_sql_seconds", "Time spent in SQL per request.", SECONDS_BUCKETS)
+SERIALIZATION_SECONDS = Histogram(
+    "university_request_serialization_seconds",
+    "Request time outside SQL: ORM hydration, building and encoding the JSON.", SECONDS_BUCKETS)
+RESPONSE_BYTES = Histogram("university_response_bytes", "Size of non-streamed response bodies.",
+                           [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216])
+METRICS = [REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, SERIALIZATION_SECONDS, RESPONSE_BYTES]
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+    threshold = app.config['SLOW_QUERY_SECONDS']
+    if threshold is not None and elapsed >= threshold:
+        app.logger.warning("Slow query (%.3fs): %s", elapsed, " ".join(statement.split()))
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+
+
+@app.after_request
+def _record_request_metrics(response):
+    if 'request_start' not in g or request.path == '/metrics':
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(route, elapsed)
+    SQL_QUERIES.observe(route, g.sql_queries)
+    SQL_SECONDS.observe(route, g.sql_seconds)
+    SERIALIZATION_SECONDS.observe(route, max(0.0, elapsed - g.sql_seconds))
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe(route, response.calculate_content_length() or 0)
+    return response
+
+
 # -------------------------- DATABASE MODELS --------------------------
 
+# Stored in PRAGMA user_version; bump whenever a table, column or index changes
+# so persistent databases built by older code are rebuilt on startup
+SCHEMA_VERSION = 4
+
 # Department model
 class Department(db.Model):
     dept_name = db.Column(db.String, primary_key=True)  # Primary key
     building = db.Column(db.String)
     budget = db.Column(db.Float)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
+    instructor_count = query_expression()  # ?include=instructor_count
+    student_count = query_expression()  # ?include=student_count
     instructors = db.relationship('Instructor', backref='department', lazy=True)
     students = db.relationship('Student', backref='department', lazy=True)
     courses = db.relationship('Course', backref='department', lazy=True)
@@ -36,8 +448,9 @@ class Department(db.Model):
 class Instructor(db.Model):
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     name = db.Column(db.String(100), nullable=False)
-    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False)  # Foreign key
+    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False, index=True)  # Foreign key
     salary = db.Column(db.Float, nullable=False)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
     teaches = db.relationship('Teaches', backref='instructor', lazy=True)
     advisors = db.relationship('Advisor', backref='instructor', lazy=True)
 
@@ -45,8 +458,10 @@ class Instructor(db.Model):
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     name = db.Column(db.String(100), nullable=False)
-    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False)  # Foreign key
+    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False, index=True)  # Foreign key
     tot_cred = db.Column(db.Integer)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
+    course_count = query_expression()  # ?include=course_count
     takes = db.relationship('Takes', backref='student', lazy=True)
     advisors = db.relationship('Advisor', backref='student', lazy=True)
 
@@ -54,8 +469,9 @@ class Student(db.Model):
 class Course(db.Model):
     course_id = db.Column(db.String, primary_key=True)  # Primary key
     title = db.Column(db.String, nullable=False)
-    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False)  # Foreign key
-    credits = db.Column(db.Integer, nullable=False)
+    dept_name = db.Column(db.String, db.ForeignKey("department.dept_name"), nullable=False, index=True)  # Foreign key
+    credits = db.Column(db.Float, nullable=False)  # the catalogue has half credits
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
     sections = db.relationship('Section', backref='course', lazy=True)
     prereqs = db.relationship('Prereq', backref='course', lazy=True)
 
@@ -67,7 +483,8 @@ class Section(db.Model):
     year = db.Column(db.Integer, primary_key=True)
     building = db.Column(db.String)
     room_no = db.Column(db.String)
-    time_slot_id = db.Column(db.String, db.ForeignKey("time_slot.time_slot_id"))
+    time_slot_id = db.Column(db.String, db.ForeignKey("time_slot.time_slot_id"), index=True)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
     takes = db.relationship('Takes', backref='section', lazy=True)
     teaches = db.relationship('Teaches', backref='section', lazy=True)
 
@@ -77,44 +494,973 @@ class TimeSlot(db.Model):
     day = db.Column(db.String)
     start_time = db.Column(db.Time)
     end_time = db.Column(db.Time)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
     sections = db.relationship('Section', backref='time_slot', lazy=True)
 
 # Takes model (many-to-many between Student and Section)
 class Takes(db.Model):
+    # The primary key starts with student_id; section lookups need their own index
+    __table_args__ = (db.Index('ix_takes_section', 'course_id', 'sec_id', 'semester', 'year'),)
+
     student_id = db.Column(db.Integer, db.ForeignKey("student.id"), primary_key=True)  # Composite key
     course_id = db.Column(db.String, db.ForeignKey("section.course_id"), primary_key=True)
     sec_id = db.Column(db.Integer, primary_key=True)
     semester = db.Column(db.String, primary_key=True)
     year = db.Column(db.Integer, primary_key=True)
     grade = db.Column(db.String)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
+    origin = db.Column(db.String, nullable=False, default='csv', server_default='csv')  # 'api': owned by bulk writes
 
 # Teaches model (many-to-many between Instructor and Section)
 class Teaches(db.Model):
+    __table_args__ = (db.Index('ix_teaches_section', 'course_id', 'sec_id', 'semester', 'year'),)
+
     instructor_id = db.Column(db.Integer, db.ForeignKey("instructor.id"), primary_key=True)  # Composite key
     course_id = db.Column(db.String, db.ForeignKey("section.course_id"), primary_key=True)
     sec_id = db.Column(db.Integer, primary_key=True)
     semester = db.Column(db.String, primary_key=True)
     year = db.Column(db.Integer, primary_key=True)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
+    origin = db.Column(db.String, nullable=False, default='csv', server_default='csv')  # 'api': owned by bulk writes
 
 # Classroom model
 class Classroom(db.Model):
     building = db.Column(db.String, primary_key=True)  # Composite key
     room_no = db.Column(db.String, primary_key=True)
     capacity = db.Column(db.Integer)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
 
 # Prerequisite model
 class Prereq(db.Model):
     course_id = db.Column(db.String, db.ForeignKey("course.course_id"), primary_key=True)  # Composite key
     prereq_id = db.Column(db.String, primary_key=True)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
 
 # Advisor model
 class Advisor(db.Model):
     s_id = db.Column(db.Integer, db.ForeignKey("student.id"), primary_key=True)  # Composite key
-    i_id = db.Column(db.Integer, db.ForeignKey("instructor.id"), primary_key=True)
+    i_id = db.Column(db.Integer, db.ForeignKey("instructor.id"), primary_key=True, index=True)
+    row_version = db.Column(db.Integer, nullable=False, default=0, index=True)  # Change tracking
+    origin = db.Column(db.String, nullable=False, default='csv', server_default='csv')  # 'api': owned by bulk writes
 
     def __repr__(self):
         return f"<Advisor Student ID: {self.s_id}, Instructor ID: {self.i_id}>"
 
+# Prerequisite closure model: every (course, prerequisite) pair reachable through Prereq
+class PrereqClosure(db.Model):
+    # Courses that require themselves, i.e. sit on a prerequisite cycle
+    __table_args__ = (db.Index('ix_prereq_closure_cycle', 'course_id',
+                               sqlite_where=db.text('course_id = prereq_id')),)
+
+    course_id = db.Column(db.String, primary_key=True)  # Composite key
+    prereq_id = db.Column(db.String, primary_key=True, index=True)
+
+# Student grade summary: what a student's GPA is computed from, maintained from Takes
+class StudentGrades(db.Model):
+    student_id = db.Column(db.Integer, db.ForeignKey("student.id"), primary_key=True)  # Primary key
+    courses_graded = db.Column(db.Integer, nullable=False)
+    graded_credits = db.Column(db.Float, nullable=False)
+    grade_points = db.Column(db.Float, nullable=False)  # sum of grade points x credits
+    student = db.relationship('Student', lazy=True)
+
+# Section enrollment summary: head count of each section, maintained from Takes
+class SectionEnrollment(db.Model):
+    course_id = db.Column(db.String, primary_key=True)  # Composite key
+    sec_id = db.Column(db.Integer, primary_key=True)
+    semester = db.Column(db.String, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    enrolled = db.Column(db.Integer, nullable=False)
+
+# Sync state model: the last row version handed out (single row, id = 1)
+class SyncState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Source file model: the CSV each table was last loaded from, so unchanged files are not reloaded
+class SourceFile(db.Model):
+    file_name = db.Column(db.String, primary_key=True)  # Primary key
+    size = db.Column(db.Integer, nullable=False)
+    mtime_ns = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String, nullable=False)
+
+# Deleted record model: tombstones so incremental syncs can replay deletes
+class DeletedRecord(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    record_key = db.Column(db.String, nullable=False)  # JSON array of the primary key values
+    version = db.Column(db.Integer, nullable=False, index=True)
+
+# -------------------------- CHANGE TRACKING --------------------------
+
+# Rows of a child table that appear inside a parent's API record. Each entry
+# selects (parent table, parent key) for the changed child rows in {rows}.
+PARENT_LINKS = {
+    'student': [
+        "SELECT 'department', changed.dept_name FROM {rows}",
+        "SELECT 'advisor', advisor.rowid FROM advisor JOIN {rows} ON advisor.s_id = changed.id",
+    ],
+    'instructor': [
+        "SELECT 'department', changed.dept_name FROM {rows}",
+        "SELECT 'course', teaches.course_id FROM teaches JOIN {rows} ON teaches.instructor_id = changed.id",
+        "SELECT 'advisor', advisor.rowid FROM advisor JOIN {rows} ON advisor.i_id = changed.id",
+    ],
+    'takes': ["SELECT 'student', changed.student_id FROM {rows}"],
+    'section': ["SELECT 'course', changed.course_id FROM {rows}"],
+    'teaches': [
+        "SELECT 'course', changed.course_id FROM {rows}",
+        "SELECT 'instructor', changed.instructor_id FROM {rows}",
+    ],
+}
+# Advisor rows embed names and have a composite key, so they are stamped by rowid
+PARENT_KEYS = {'department': 'dept_name', 'student': 'id', 'course': 'course_id', 'instructor': 'id',
+               'advisor': 'rowid'}
+
+# Derived data kept in step with a table: table name -> functions(conn, version)
+# called in the transaction that stamped the table's changes with `version`
+AFTER_TABLE_CHANGE = {}
+
+
+def after_table_change(*table_names):
+    """Register a function to run after each change to the given tables."""
+    def register(function):
+        for table_name in table_names:
+            AFTER_TABLE_CHANGE.setdefault(table_name, []).append(function)
+        return function
+    return register
+
+
+def run_table_change_hooks(conn, table_name, version):
+    for function in AFTER_TABLE_CHANGE.get(table_name, []):
+        function(conn, version)
+
+
+def next_row_version(conn):
+    """Allocate the version stamped on the rows changed by the current write transaction.
+
+    The counter is bumped inside that same transaction and SQLite runs one
+    writer at a time, so versions become visible in increasing order.
+    """
+    conn.exec_driver_sql("INSERT INTO sync_state (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING")
+    return conn.exec_driver_sql("UPDATE sync_state SET version = version + 1 WHERE id = 1 RETURNING version").scalar()
+
+
+def current_row_version():
+    """Highest row version committed so far (0 before the first load)."""
+    return db.session.query(SyncState.version).filter_by(id=1).scalar() or 0
+
+
+def record_parent_changes(conn, table_name, rows_sql, parameters=()):
+    """Queue the parent records that embed the rows of `table_name` selected by `rows_sql`."""
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS sync_changes (table_name, record_key)")
+    for link in PARENT_LINKS.get(table_name, []):
+        conn.exec_driver_sql(
+            "INSERT INTO temp.sync_changes " + link.format(rows=f"({rows_sql}) AS changed"), parameters
+        )
+
+
+def touch_parent_records(conn, version):
+    """Stamp every queued parent record with `version` and empty the queue."""
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS sync_changes (table_name, record_key)")
+    for parent, key in PARENT_KEYS.items():
+        conn.exec_driver_sql(
+            f"UPDATE {parent} SET row_version = ? WHERE {key} IN "
+            f"(SELECT record_key FROM temp.sync_changes WHERE table_name = ?)",
+            (version, parent),
+        )
+    conn.exec_driver_sql("DELETE FROM temp.sync_changes")
+
+
+def _key_clause(table, identity):
+    keys = [column.name for column in table.primary_key.columns]
+    return " AND ".join(f"{key} = ?" for key in keys), tuple(identity)
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_orm_changes(session, flush_context, instances):
+    changed = [obj for obj in session.new if hasattr(obj, 'row_version')]
+    changed += [obj for obj in session.dirty if hasattr(obj, 'row_version') and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if hasattr(obj, 'row_version')]
+    if not changed and not deleted:
+        return
+    conn = session.connection()
+    version = next_row_version(conn)
+    # Parents of the rows' previous state, read before the flush rewrites them
+    for obj in deleted + [obj for obj in changed if obj not in session.new]:
+        where, parameters = _key_clause(obj.__table__, inspect(obj).identity)
+        record_parent_changes(conn, obj.__tablename__, f"SELECT * FROM {obj.__tablename__} WHERE {where}", parameters)
+    for obj in deleted:
+        session.add(DeletedRecord(table_name=obj.__tablename__,
+                                  record_key=json.dumps(list(inspect(obj).identity)), version=version))
+    for obj in changed:
+        obj.row_version = version
+    session.info['row_version'] = version
+    session.info.setdefault('changed_tables', set()).update(obj.__tablename__ for obj in changed + deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_orm_parents(session, flush_context):
+    version = session.info.pop('row_version', None)
+    if version is None:
+        return
+    conn = session.connection()
+    for table_name in session.info['changed_tables']:
+        record_parent_changes(conn, table_name, f"SELECT * FROM {table_name} WHERE row_version = ?", (version,))
+    touch_parent_records(conn, version)
+    for table_name in session.info['changed_tables']:
+        run_table_change_hooks(conn, table_name, version)
+    session.info['changed_tables'].clear()
+    session.info['needs_invalidation'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_orm_write(session):
+    if session.info.pop('needs_invalidation', False):
+        invalidate_caches()
+
+
+def filter_since(query, model):
+    """Restrict a list query to rows changed after `?since=<row version>`."""
+    if 'since' not in request.args:
+        return query
+    return query.filter(model.row_version > int(request.args['since']))
+
+
+def since_fields():
+    """Extra response fields for `?since=` requests: the version to resume from next time."""
+    return {"version": data_version()} if 'since' in request.args else {}
+
+
+# -------------------------- PREREQUISITE GRAPH --------------------------
+
+# Changing more edges than this in one transaction rebuilds the closure from scratch
+PREREQ_CLOSURE_REBUILD_EDGES = 100
+
+# All (course, prerequisite) pairs reachable from the given Prereq edges;
+# UNION drops repeated pairs, so cycles terminate
+PREREQ_REACH_SQL = """
+WITH RECURSIVE reach(course_id, prereq_id) AS (
+    SELECT course_id, prereq_id FROM prereq {where}
+    UNION
+    SELECT reach.course_id, prereq.prereq_id FROM reach JOIN prereq ON prereq.course_id = reach.prereq_id
+)
+INSERT OR IGNORE INTO prereq_closure (course_id, prereq_id) SELECT course_id, prereq_id FROM reach
+"""
+
+
+def rebuild_prereq_closure(conn):
+    conn.exec_driver_sql("DELETE FROM prereq_closure")
+    conn.exec_driver_sql(PREREQ_REACH_SQL.format(where=""))
+
+
+@after_table_change('prereq')
+def update_prereq_closure(conn, version):
+    """Apply the Prereq edges added and removed at `version` to prereq_closure.
+
+    An added edge course -> prereq links everything that requires `course`
+    (and `course` itself) to `prereq` and everything `prereq` requires: one
+    INSERT per edge. A removed edge can only shrink the closure of `course`
+    and of the courses requiring it, so only those rows are re-derived.
+    """
+    added = conn.exec_driver_sql(
+        "SELECT course_id, prereq_id FROM prereq WHERE row_version = ?", (version,)
+    ).fetchall()
+    removed = [json.loads(key) for (key,) in conn.exec_driver_sql(
+        "SELECT record_key FROM deleted_record WHERE table_name = 'prereq' AND version = ?", (version,)
+    )]
+    if len(added) + len(removed) > PREREQ_CLOSURE_REBUILD_EDGES:
+        rebuild_prereq_closure(conn)
+        return
+
+    if removed:
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS closure_sources (course_id PRIMARY KEY)")
+        for course_id, prereq_id in removed:
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO temp.closure_sources SELECT ? UNION "
+                "SELECT course_id FROM prereq_closure WHERE prereq_id = ?", (course_id, course_id)
+            )
+        conn.exec_driver_sql("DELETE FROM prereq_closure WHERE course_id IN (SELECT course_id FROM temp.closure_sources)")
+        conn.exec_driver_sql(PREREQ_REACH_SQL.format(
+            where="WHERE course_id IN (SELECT course_id FROM temp.closure_sources)"
+        ))
+        conn.exec_driver_sql("DELETE FROM temp.closure_sources")
+
+    for course_id, prereq_id in added:
+        conn.exec_driver_sql(
+            "INSERT OR IGNORE INTO prereq_closure (course_id, prereq_id) "
+            "SELECT sources.course_id, targets.prereq_id "
+            "FROM (SELECT ? AS course_id UNION SELECT course_id FROM prereq_closure WHERE prereq_id = ?) AS sources "
+            "CROSS JOIN (SELECT ? AS prereq_id UNION SELECT prereq_id FROM prereq_closure WHERE course_id = ?) AS targets",
+            (course_id, course_id, prereq_id, prereq_id),
+        )
+
+
+
+def find_prereq_cycles():
+    """Group the courses that (transitively) require themselves into cycles.
+
+    Two such courses are on the same cycle when each requires the other.
+    """
+    cyclic = [row.course_id for row in PrereqClosure.query.filter(
+        PrereqClosure.course_id == PrereqClosure.prereq_id
+    ).order_by(PrereqClosure.course_id)]
+    if not cyclic:
+        return []
+    reaches = {}
+    for course_id, prereq_id in db.session.query(PrereqClosure.course_id, PrereqClosure.prereq_id).filter(
+        PrereqClosure.course_id.in_(cyclic), PrereqClosure.prereq_id.in_(cyclic)
+    ):
+        reaches.setdefault(course_id, set()).add(prereq_id)
+    cycles = []
+    seen = set()
+    for course_id in cyclic:
+        if course_id not in seen:
+            cycle = sorted(other for other in reaches[course_id] if course_id in reaches[other])
+            seen.update(cycle)
+            cycles.append(cycle)
+    return cycles
+
+# -------------------------- SCHEDULE CONFLICTS --------------------------
+
+SECTION_KEY = ('course_id', 'sec_id', 'semester', 'year')
+
+
+def _section_join(other):
+    return db.and_(*(getattr(Section, column) == getattr(other, column) for column in SECTION_KEY))
+
+
+def scheduled_sections(kind):
+    """Query of (resource..., semester, year, day, start, end, course_id, sec_id) for one conflict kind.
+
+    The rows come sorted so that each (resource, term, day) group is
+    contiguous and ordered by start time, ready for a single sweep.
+    """
+    slot_columns = (Section.semester, Section.year, TimeSlot.day, TimeSlot.start_time, TimeSlot.end_time,
+                    Section.course_id, Section.sec_id)
+    if kind == 'room':
+        resource = (Section.building, Section.room_no)
+        query = db.session.query(*resource, *slot_columns)
+    elif kind == 'instructor':
+        resource = (Teaches.instructor_id,)
+        query = db.session.query(*resource, *slot_columns).select_from(Teaches).join(Section, _section_join(Teaches))
+    elif kind == 'student':
+        resource = (Takes.student_id,)
+        query = db.session.query(*resource, *slot_columns).select_from(Takes).join(Section, _section_join(Takes))
+    else:
+        raise ValueError(f"unknown conflict kind: {kind}")
+    query = query.join(TimeSlot, TimeSlot.time_slot_id == Section.time_slot_id)
+    return query.order_by(*resource, Section.semester, Section.year, TimeSlot.day, TimeSlot.start_time), len(resource)
+
+
+def sweep_overlaps(intervals):
+    """Yield every overlapping pair of (start, end, item) intervals sorted by start.
+
+    Intervals that ended are dropped from a heap keyed by end time, so the
+    cost is O(n log n + number of overlaps) instead of comparing all pairs.
+    Intervals that only touch (one ends when the next starts) do not overlap.
+    """
+    active = []
+    for order, (start, end, item) in enumerate(intervals):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, _, other in active:
+            yield other, item, start, min(end, other_end)
+        heapq.heappush(active, (end, order, item))
+
+
+def find_schedule_conflicts(kind, semester=None, year=None):
+    """Yield the double bookings of rooms, instructors or students as dicts."""
+    query, resource_width = scheduled_sections(kind)
+    if semester:
+        query = query.filter(Section.semester == semester)
+    if year:
+        query = query.filter(Section.year == int(year))
+    rows = query.yield_per(app.config['STREAM_BATCH_SIZE'])
+    for group, group_rows in itertools.groupby(rows, key=lambda row: tuple(row[:resource_width + 3])):
+        if None in group[:resource_width]:
+            continue  # sections without a room
+        intervals = ((row[-4], row[-3], row[-2:]) for row in group_rows)
+        for first, second, start, end in sweep_overlaps(intervals):
+            yield {
+                "kind": kind,
+                "resource": list(group[:resource_width]),
+                "semester": group[resource_width],
+                "year": group[resource_width + 1],
+                "day": group[resource_width + 2],
+                "start_time": start.strftime("%H:%M"),
+                "end_time": end.strftime("%H:%M"),
+                "sections": [
+                    {"course_id": first[0], "sec_id": first[1]},
+                    {"course_id": second[0], "sec_id": second[1]},
+                ],
+            }
+
+
+def find_enrollment_conflicts(student_id, course_id, sec_id, semester, year):
+    """Sections the student already takes that overlap the given section.
+
+    Reads only the student's own enrollments for that term (a primary key
+    range), so the cost does not grow with the size of the schedule.
+    """
+    candidate = db.session.query(TimeSlot.day, TimeSlot.start_time, TimeSlot.end_time).join(
+        Section, TimeSlot.time_slot_id == Section.time_slot_id
+    ).filter(Section.course_id == course_id, Section.sec_id == sec_id,
+             Section.semester == semester, Section.year == year).first()
+    if candidate is None:
+        return []
+    day, start, end = candidate
+    return db.session.query(Section.course_id, Section.sec_id, TimeSlot.day, TimeSlot.start_time,
+                            TimeSlot.end_time).select_from(Takes).join(Section, _section_join(Takes)).join(
+        TimeSlot, TimeSlot.time_slot_id == Section.time_slot_id
+    ).filter(
+        Takes.student_id == student_id, Takes.semester == semester, Takes.year == year,
+        TimeSlot.day == day, TimeSlot.start_time < end, TimeSlot.end_time > start,
+        db.or_(Takes.course_id != course_id, Takes.sec_id != sec_id),
+    ).order_by(TimeSlot.start_time).all()
+
+# -------------------------- ANALYTICS --------------------------
+
+# Grades that count towards the GPA; anything else (NC, blank) is ungraded
+GRADE_POINTS = {'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}
+GRADE_POINTS_SQL = "CASE takes.grade " + " ".join(
+    f"WHEN '{grade}' THEN {points}" for grade, points in GRADE_POINTS.items()
+) + " END"
+
+
+def refresh_student_grades(conn, students_sql, parameters=()):
+    """Recompute the student_grades rows of the students selected by `students_sql`.
+
+    Only those students' takes are read, through the takes primary key.
+    """
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS affected_students (student_id PRIMARY KEY)")
+    conn.exec_driver_sql(f"INSERT OR IGNORE INTO temp.affected_students {students_sql}", parameters)
+    conn.exec_driver_sql(
+        "DELETE FROM student_grades WHERE student_id IN (SELECT student_id FROM temp.affected_students)"
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO student_grades (student_id, courses_graded, graded_credits, grade_points) "
+        f"SELECT takes.student_id, count(*), sum(course.credits), sum({GRADE_POINTS_SQL} * course.credits) "
+        f"FROM temp.affected_students AS affected "
+        f"JOIN takes ON takes.student_id = affected.student_id "
+        f"JOIN course ON course.course_id = takes.course_id "
+        f"WHERE takes.grade IN ({', '.join('?' * len(GRADE_POINTS))}) "
+        f"GROUP BY takes.student_id",
+        tuple(GRADE_POINTS),
+    )
+    conn.exec_driver_sql("DELETE FROM temp.affected_students")
+
+
+def refresh_section_enrollment(conn, sections_sql, parameters=()):
+    """Recompute the section_enrollment rows of the sections selected by `sections_sql`."""
+    key = ', '.join(SECTION_KEY)
+    joined = ' AND '.join(f"{{table}}.{column} = affected.{column}" for column in SECTION_KEY)
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS affected_sections ({key}, PRIMARY KEY ({key}))"
+    )
+    conn.exec_driver_sql(f"INSERT OR IGNORE INTO temp.affected_sections {sections_sql}", parameters)
+    conn.exec_driver_sql(
+        f"DELETE FROM section_enrollment WHERE rowid IN (SELECT section_enrollment.rowid "
+        f"FROM temp.affected_sections AS affected "
+        f"JOIN section_enrollment ON {joined.format(table='section_enrollment')})"
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO section_enrollment ({key}, enrolled) "
+        f"SELECT {', '.join(f'affected.{column}' for column in SECTION_KEY)}, count(*) "
+        f"FROM temp.affected_sections AS affected JOIN takes ON {joined.format(table='takes')} "
+        f"GROUP BY {', '.join(f'affected.{column}' for column in SECTION_KEY)}"
+    )
+    conn.exec_driver_sql("DELETE FROM temp.affected_sections")
+
+
+@after_table_change('takes')
+def update_takes_summaries(conn, version):
+    # Added and updated takes carry the version; deleted ones left a tombstone
+    tombstones = "FROM deleted_record WHERE table_name = 'takes' AND version = ?"
+    refresh_student_grades(conn, (
+        f"SELECT student_id FROM takes WHERE row_version = ? "
+        f"UNION SELECT json_extract(record_key, '$[0]') {tombstones}"
+    ), (version, version))
+    refresh_section_enrollment(conn, (
+        f"SELECT {', '.join(SECTION_KEY)} FROM takes WHERE row_version = ? UNION SELECT "
+        + ", ".join(f"json_extract(record_key, '$[{index}]')" for index in range(1, 5))
+        + f" {tombstones}"
+    ), (version, version))
+
+
+@after_table_change('course')
+def update_course_credit_summaries(conn, version):
+    # New credits change the GPA of everyone who took the course
+    refresh_student_grades(conn, (
+        "SELECT takes.student_id FROM course JOIN takes ON takes.course_id = course.course_id "
+        "WHERE course.row_version = ?"
+    ), (version,))
+
+# -------------------------- FULL-TEXT SEARCH --------------------------
+
+# Searchable record types: kind -> (model, indexed text column, key column)
+SEARCH_INDEXES = {
+    'course': (Course, 'title', 'course_id'),
+    'student': (Student, 'name', 'id'),
+    'instructor': (Instructor, 'name', 'id'),
+    'department': (Department, 'dept_name', 'dept_name'),
+}
+
+
+def search_index_ddl(table_name, column):
+    """DDL of the FTS5 index over one text column and the triggers that keep it in sync.
+
+    The index is an external-content table: it holds only the tokens and
+    reads the text back from the model table by rowid. The triggers see
+    every write, whether it comes from load_data, the ORM or plain SQL.
+    """
+    fts = f"{table_name}_search"
+    delete_old = f"INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});"
+    insert_new = f"INSERT INTO {fts} (rowid, {column}) VALUES (new.rowid, new.{column});"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table_name}', content_rowid='rowid', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table_name} BEGIN {insert_new} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table_name} BEGIN {delete_old} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {column} ON {table_name} BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+for _model, _column, _ in SEARCH_INDEXES.values():
+    for _statement in search_index_ddl(_model.__tablename__, _column):
+        event.listen(_model.__table__, 'after_create', db.DDL(_statement))
+    event.listen(_model.__table__, 'before_drop', db.DDL(f"DROP TABLE IF EXISTS {_model.__tablename__}_search"))
+
+
+def fts_query(text):
+    """FTS5 query matching every word of `text` as a prefix: 'data eng' -> "data"* "eng"*."""
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search_records(text, kinds, page, page_size):
+    """Ranked full-text hits for `text` over the given kinds; returns (hits, total).
+
+    Each index returns at most its best page * page_size hits by bm25 rank;
+    the best page_size of those are then merged across kinds. A hit is
+    (kind, key, text, score), best score first.
+    """
+    query = fts_query(text)
+    if not query:
+        return [], 0
+    parts, totals = [], []
+    for kind in kinds:
+        model, column, key = SEARCH_INDEXES[kind]
+        table = model.__tablename__
+        fts = f"{table}_search"
+        parts.append(
+            f"SELECT * FROM (SELECT '{kind}' AS kind, {table}.{key} AS record_key, {table}.{column} AS text, "
+            f"{fts}.rank AS score FROM {fts} JOIN {table} ON {table}.rowid = {fts}.rowid "
+            f"WHERE {fts} MATCH :query ORDER BY {fts}.rank LIMIT :depth)"
+        )
+        totals.append(f"(SELECT count(*) FROM {fts} WHERE {fts} MATCH :query)")
+    parameters = {"query": query, "depth": page * page_size, "limit": page_size, "offset": (page - 1) * page_size}
+    hits = db.session.execute(db.text(
+        " UNION ALL ".join(parts) + " ORDER BY score, kind, record_key LIMIT :limit OFFSET :offset"
+    ), parameters).all()
+    total = db.session.execute(db.text(f"SELECT {' + '.join(totals)}"), parameters).scalar()
+    return hits, total
+
+# -------------------------- SERIALIZERS --------------------------
+
+class Fieldset:
+    """What an endpoint can return, narrowed per request by ?fields= and ?include=.
+
+    `fields` (plain values) and `includes` (nested or joined data) map an
+    output name to (load, get): `load` is the column attribute or loader
+    option the value needs, `get` reads it from a row. Only the requested
+    columns are selected and only the requested relationships are loaded.
+    Without ?fields= every field is returned and without ?include= the
+    `default_includes` (all of them unless given), so plain requests keep
+    their shape; an empty ?include= drops them all.
+    """
+
+    def __init__(self, fields, includes=None, default_includes=None):
+        self.fields = fields
+        self.includes = includes or {}
+        self.default_includes = list(self.includes) if default_includes is None else default_includes
+
+    def requested(self, param, choices, default=None):
+        if param not in request.args:
+            return list(choices) if default is None else list(default)
+        names = [name for name in request.args[param].split(',') if name]
+        unknown = [name for name in names if name not in choices]
+        if unknown:
+            raise ValueError(f"unknown {param}: {', '.join(unknown)} (choose from {', '.join(choices)})")
+        return names
+
+    def apply(self, query):
+        """Narrow `query` to the request; returns (query, serialize, names of the includes)."""
+        includes = self.requested('include', self.includes, self.default_includes)
+        chosen = [(name, self.fields[name]) for name in self.requested('fields', self.fields)]
+        chosen += [(name, self.includes[name]) for name in includes]
+        mapper = inspect(query.column_descriptions[0]['entity'])
+        columns = [getattr(mapper.class_, mapper.get_property_by_column(column).key) for column in mapper.primary_key]
+        options = []
+        for _, (load, _) in chosen:
+            if isinstance(load, InstrumentedAttribute):
+                columns.append(load)
+            elif load is not None:
+                options.append(load)
+        query = query.options(load_only(*columns), *options)
+
+        def serialize(row):
+            return {name: get(row) for name, (_, get) in chosen if get is not None}
+
+        return query, serialize, includes
+
+
+def format_time(value):
+    return value.strftime("%H:%M") if value else None
+
+
+TIME_SLOT_FIELDS = Fieldset({
+    "time_slot_id": (TimeSlot.time_slot_id, lambda time_slot: time_slot.time_slot_id),
+    "day": (TimeSlot.day, lambda time_slot: time_slot.day),
+    "start_time": (TimeSlot.start_time, lambda time_slot: format_time(time_slot.start_time)),
+    "end_time": (TimeSlot.end_time, lambda time_slot: format_time(time_slot.end_time)),
+})
+
+INSTRUCTOR_FIELDS = Fieldset({
+    "id": (Instructor.id, lambda instructor: instructor.id),
+    "name": (Instructor.name, lambda instructor: instructor.name),
+    "dept_name": (Instructor.dept_name, lambda instructor: instructor.dept_name),
+    "salary": (Instructor.salary, lambda instructor: instructor.salary),
+}, {
+    "courses": (selectinload(Instructor.teaches), lambda instructor: [
+        {
+            "course_id": teach.course_id,
+            "section": teach.sec_id,
+            "semester": teach.semester,
+            "year": teach.year,
+        }
+        for teach in instructor.teaches
+    ]),
+})
+
+ADVISOR_FIELDS = Fieldset({
+    "student_id": (Advisor.s_id, lambda advisor: advisor.s_id),
+    "student_name": (joinedload(Advisor.student).load_only(Student.name),
+                     lambda advisor: advisor.student.name if advisor.student else None),
+    "instructor_id": (Advisor.i_id, lambda advisor: advisor.i_id),
+    "instructor_name": (joinedload(Advisor.instructor).load_only(Instructor.name),
+                        lambda advisor: advisor.instructor.name if advisor.instructor else None),
+})
+
+CLASSROOM_FIELDS = Fieldset({
+    "building": (Classroom.building, lambda classroom: classroom.building),
+    "room_no": (Classroom.room_no, lambda classroom: classroom.room_no),
+    "capacity": (Classroom.capacity, lambda classroom: classroom.capacity),
+})
+
+SECTION_FIELDS = Fieldset({
+    "course_id": (Section.course_id, lambda section: section.course_id),
+    "sec_id": (Section.sec_id, lambda section: section.sec_id),
+    "semester": (Section.semester, lambda section: section.semester),
+    "year": (Section.year, lambda section: section.year),
+    "building": (Section.building, lambda section: section.building),
+    "room_no": (Section.room_no, lambda section: section.room_no),
+}, {
+    "time_slot": (joinedload(Section.time_slot).load_only(TimeSlot.time_slot_id), lambda section: {
+        "time_slot_id": section.time_slot.time_slot_id,
+    } if section.time_slot else None),
+})
+
+PREREQ_FIELDS = Fieldset({
+    "course_id": (Prereq.course_id, lambda prereq: prereq.course_id),
+    "prereq_id": (Prereq.prereq_id, lambda prereq: prereq.prereq_id),
+})
+
+TAKE_FIELDS = Fieldset({
+    "student_id": (Takes.student_id, lambda take: take.student_id),
+    "course_id": (Takes.course_id, lambda take: take.course_id),
+    "section_id": (Takes.sec_id, lambda take: take.sec_id),
+    "semester": (Takes.semester, lambda take: take.semester),
+    "year": (Takes.year, lambda take: take.year),
+    "grade": (Takes.grade, lambda take: take.grade),
+})
+
+TEACH_FIELDS = Fieldset({
+    "instructor_id": (Teaches.instructor_id, lambda teach: teach.instructor_id),
+    "course_id": (Teaches.course_id, lambda teach: teach.course_id),
+    "section_id": (Teaches.sec_id, lambda teach: teach.sec_id),
+    "semester": (Teaches.semester, lambda teach: teach.semester),
+    "year": (Teaches.year, lambda teach: teach.year),
+})
+
+# Counts are correlated subqueries on the indexed foreign keys, so a caller
+# that only wants sizes never loads the collections
+DEPARTMENT_FIELDS = Fieldset({
+    "dept_name": (Department.dept_name, lambda dept: dept.dept_name),
+    "building": (Department.building, lambda dept: dept.building),
+    "budget": (Department.budget, lambda dept: dept.budget),
+}, {
+    "instructors": (selectinload(Department.instructors).load_only(Instructor.name, Instructor.salary), lambda dept: [
+        {"id": ins.id, "name": ins.name, "salary": ins.salary}
+        for ins in dept.instructors
+    ]),
+    "students": (selectinload(Department.students).load_only(Student.name), lambda dept: [
+        {"id": stu.id, "name": stu.name}
+        for stu in dept.students
+    ]),
+    "instructor_count": (with_expression(Department.instructor_count, db.select(func.count()).where(
+        Instructor.dept_name == Department.dept_name).scalar_subquery()), lambda dept: dept.instructor_count),
+    "student_count": (with_expression(Department.student_count, db.select(func.count()).where(
+        Student.dept_name == Department.dept_name).scalar_subquery()), lambda dept: dept.student_count),
+}, default_includes=["instructors", "students"])
+
+STUDENT_FIELDS = Fieldset({
+    "id": (Student.id, lambda stu: stu.id),
+    "name": (Student.name, lambda stu: stu.name),
+    "dept_name": (Student.dept_name, lambda stu: stu.dept_name),
+    "tot_cred": (Student.tot_cred, lambda stu: stu.tot_cred),
+}, {
+    "courses": (selectinload(Student.takes).load_only(Takes.course_id), lambda stu: [
+        {
+            "course_id": take.course_id,
+            "section_id": take.sec_id,
+            "semester": take.semester,
+            "year": take.year,
+        }
+        for take in stu.takes
+    ]),
+    "course_count": (with_expression(Student.course_count, db.select(func.count()).where(
+        Takes.student_id == Student.id).scalar_subquery()), lambda stu: stu.course_count),
+}, default_includes=["courses"])
+
+# get_courses loads the instructors itself (see there), hence no loader or getter
+COURSE_FIELDS = Fieldset({
+    "course_id": (Course.course_id, lambda course: course.course_id),
+    "title": (Course.title, lambda course: course.title),
+    "dept_name": (Course.dept_name, lambda course: course.dept_name),
+    "credits": (Course.credits, lambda course: course.credits),
+}, {
+    "instructors": (selectinload(Course.sections).load_only(Section.course_id), None),
+})
+
+
+def stream_ndjson(query, serialize):
+    """Stream a query as newline-delimited JSON without materializing the table.
+
+    Rows come from the cursor STREAM_BATCH_SIZE at a time and are written
+    out one batch per chunk, so memory stays flat regardless of table size.
+    """
+    batch_size = app.config['STREAM_BATCH_SIZE']
+
+    def generate():
+        lines = []
+        for row in query.yield_per(batch_size):
+            lines.append(json.dumps(serialize(row)))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# -------------------------- BULK WRITES --------------------------
+
+# Tables written by bulk POST/PATCH: name -> (model, Fieldset naming the API fields,
+# references each row must match as (table, {column: referenced column}))
+BULK_TABLES = {
+    'takes': (Takes, TAKE_FIELDS, [
+        ('student', {'student_id': 'id'}),
+        ('section', {column: column for column in SECTION_KEY}),
+    ]),
+    'teaches': (Teaches, TEACH_FIELDS, [
+        ('instructor', {'instructor_id': 'id'}),
+        ('section', {column: column for column in SECTION_KEY}),
+    ]),
+    'advisor': (Advisor, ADVISOR_FIELDS, [
+        ('student', {'s_id': 'id'}),
+        ('instructor', {'i_id': 'id'}),
+    ]),
+}
+BULK_STATUSES = ('created', 'updated', 'unchanged', 'skipped', 'error')
+
+
+def bulk_columns(fields):
+    """API field name -> table column, for the plain column fields of a Fieldset."""
+    return {name: load.property.columns[0] for name, (load, _) in fields.fields.items()
+            if isinstance(load, InstrumentedAttribute)}
+
+
+def parse_bulk_row(row, columns):
+    """Convert one request row to {column name: value}; returns (values, error)."""
+    if not isinstance(row, dict):
+        return None, "expected an object"
+    unknown = [name for name in row if name not in columns]
+    if unknown:
+        return None, f"unknown fields: {', '.join(unknown)} (choose from {', '.join(columns)})"
+    values = {}
+    for name, column in columns.items():
+        if row.get(name) is None:
+            if column.primary_key:
+                return None, f"{name} is required"
+            if name in row:
+                values[column.name] = None
+            continue
+        python_type = column.type.python_type
+        if isinstance(row[name], (dict, list, bool)):
+            return None, f"{name}: expected {python_type.__name__}"
+        try:
+            values[column.name] = python_type(row[name])
+        except (TypeError, ValueError):
+            return None, f"{name}: expected {python_type.__name__}"
+    return values, None
+
+
+def bulk_write(table_name, records, upsert=False, atomic=True):
+    """Write a batch of rows to a link table in one transaction.
+
+    The rows are staged in a temporary table and checked with set-based
+    statements that probe the primary key indexes: keys repeated within the
+    batch, unknown students, instructors or sections, and (unless
+    `upsert`) rows that already exist. With `atomic` one failed row rolls
+    the whole batch back; otherwise only the failed rows are left out. With
+    `upsert` existing rows take the fields given for them. Returns (row
+    version of the write or None, per-row results).
+    """
+    model, fields, references = BULK_TABLES[table_name]
+    columns = bulk_columns(fields)
+    keys = [column.name for column in model.__table__.primary_key.columns]
+    values = [column.name for column in columns.values() if not column.primary_key]
+    staged_columns = keys + values + [f"given_{column}" for column in values]
+    joined = " AND ".join(f"{table_name}.{key} = bulk_rows.{key}" for key in keys)
+
+    results = [{"index": index, "status": "skipped"} for index in range(len(records))]
+    staged = []
+    for index, row in enumerate(records):
+        parsed, error = parse_bulk_row(row, columns)
+        if error:
+            results[index].update(status="error", error=error)
+        else:
+            staged.append((index, *(parsed.get(column) for column in keys + values),
+                           *(column in parsed for column in values)))
+
+    with db.engine.connect() as conn:
+        # The first statement writes, so SQLite's write lock is held from the checks to the commit
+        version = next_row_version(conn)
+        conn.exec_driver_sql("DROP TABLE IF EXISTS temp.bulk_rows")
+        conn.exec_driver_sql(
+            f"CREATE TEMP TABLE bulk_rows (n INTEGER PRIMARY KEY, {', '.join(staged_columns)}, status, error)"
+        )
+        if staged:
+            conn.exec_driver_sql(
+                f"INSERT INTO temp.bulk_rows (n, {', '.join(staged_columns)}) "
+                f"VALUES ({', '.join('?' * (len(staged_columns) + 1))})",
+                staged,
+            )
+        conn.exec_driver_sql(
+            f"UPDATE temp.bulk_rows SET error = 'repeats an earlier row of this request' "
+            f"WHERE n NOT IN (SELECT min(n) FROM temp.bulk_rows GROUP BY {', '.join(keys)})"
+        )
+        for referenced, links in references:
+            matches = " AND ".join(f"{referenced}.{target} = bulk_rows.{column}" for column, target in links.items())
+            conn.exec_driver_sql(
+                f"UPDATE temp.bulk_rows SET error = ? WHERE error IS NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {referenced} WHERE {matches})",
+                (f"unknown {referenced}",),
+            )
+        conn.exec_driver_sql(
+            f"UPDATE temp.bulk_rows SET {'status' if upsert else 'error'} = ? WHERE error IS NULL "
+            f"AND EXISTS (SELECT 1 FROM {table_name} WHERE {joined})",
+            ('unchanged' if upsert else 'already exists',),
+        )
+
+        failed = conn.exec_driver_sql("SELECT count(*) FROM temp.bulk_rows WHERE error IS NOT NULL").scalar()
+        if atomic and (failed or len(staged) < len(records)):
+            for index, error in conn.exec_driver_sql(
+                "SELECT n, error FROM temp.bulk_rows WHERE error IS NOT NULL"
+            ):
+                results[index].update(status="error", error=error)
+            conn.rollback()
+            return None, results
+
+        # Rows the API wrote or changed are marked so a later CSV load leaves them alone
+        conn.exec_driver_sql(
+            f"INSERT INTO {table_name} ({', '.join(keys + values)}, row_version, origin) "
+            f"SELECT {', '.join(keys + values)}, ?, 'api' FROM temp.bulk_rows WHERE error IS NULL AND status IS NULL",
+            (version,),
+        )
+        conn.exec_driver_sql("UPDATE temp.bulk_rows SET status = 'created' WHERE error IS NULL AND status IS NULL")
+        if upsert and values:
+            # Only the fields a row gives are set, and rows already holding them keep their version
+            differs = " OR ".join(
+                f"(bulk_rows.given_{column} AND {table_name}.{column} IS NOT bulk_rows.{column})" for column in values
+            )
+            conn.exec_driver_sql(
+                f"UPDATE {table_name} SET " + ", ".join(
+                    f"{column} = CASE WHEN bulk_rows.given_{column} THEN bulk_rows.{column} "
+                    f"ELSE {table_name}.{column} END" for column in values
+                ) + f", row_version = ?, origin = 'api' FROM temp.bulk_rows "
+                f"WHERE {joined} AND bulk_rows.status = 'unchanged' AND ({differs})",
+                (version,),
+            )
+            conn.exec_driver_sql(
+                f"UPDATE temp.bulk_rows SET status = 'updated' WHERE status = 'unchanged' "
+                f"AND EXISTS (SELECT 1 FROM {table_name} WHERE {joined} AND {table_name}.row_version = ?)",
+                (version,),
+            )
+        for index, status, error in conn.exec_driver_sql("SELECT n, status, error FROM temp.bulk_rows"):
+            results[index].update({"status": "error", "error": error} if error else {"status": status})
+
+        # The keys embedded in parent records never change, so the new rows name every parent
+        if table_name in PARENT_LINKS:
+            record_parent_changes(conn, table_name, f"SELECT * FROM {table_name} WHERE row_version = ?", (version,))
+        touch_parent_records(conn, version)
+        run_table_change_hooks(conn, table_name, version)
+        conn.exec_driver_sql("DROP TABLE temp.bulk_rows")
+        conn.commit()
+    invalidate_caches()
+    return version, results
+
+
+def bulk_write_response(table_name):
+    """Response of a bulk POST (insert) or PATCH (insert or update) to `table_name`.
+
+    The body is a list of records, or {"records": [...]}, with the fields
+    of the table's GET endpoint. `?atomic=0` writes the valid rows even if
+    others fail.
+    """
+    try:
+        payload = request.get_json()
+        records = payload.get('records') if isinstance(payload, dict) else payload
+        if not isinstance(records, list):
+            raise ValueError('expected a list of records or {"records": [...]}')
+        if len(records) > app.config['MAX_BULK_ROWS']:
+            raise ValueError(f"at most {app.config['MAX_BULK_ROWS']} records per request")
+        version, results = bulk_write(table_name, records, upsert=request.method == 'PATCH',
+                                      atomic=request.args.get('atomic', '1') != '0')
+        counts = Counter(result["status"] for result in results)
+        data = {
+            "version": version,
+            "total": len(results),
+            **{status: counts[status] for status in BULK_STATUSES},
+            "records": results,
+        }
+        if version is None:
+            return jsonify({
+                "code": 0,
+                "msg": "Error",
+                "error": f"{counts['error']} of {len(results)} records failed, nothing was written",
+                "data": data
+            })
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": data
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
 # -------------------------- API ENDPOINTS --------------------------
 
 # API Endpoints
@@ -123,41 +1469,24 @@ def home():
     return "Welcome to the University Database API!"
 
 @app.route('/departments', methods=['GET'])
+@cached_response
 def get_departments():
     try:
-        # Get pagination parameters
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 10))
-        
         # Fetch paginated data
-        departments_query = Department.query
-        departments, total_records = paginate(departments_query, page, page_size)
+        # Requested collections are eager-loaded so a page costs a fixed number of queries
+        sync = since_fields()
+        departments_query, serialize, _ = DEPARTMENT_FIELDS.apply(filter_ids(filter_since(Department.query, Department), Department))
+        departments, pagination = fetch_page(departments_query.order_by(Department.dept_name), [Department.dept_name])
         
         # Build response
-        response = [
-            {
-                "dept_name": dept.dept_name,
-                "building": dept.building,
-                "budget": dept.budget,
-                "instructors": [
-                    {"id": ins.id, "name": ins.name, "salary": ins.salary}
-                    for ins in dept.instructors
-                ],
-                "students": [
-                    {"id": stu.id, "name": stu.name}
-                    for stu in dept.students
-                ],
-            }
-            for dept in departments
-        ]
+        response = [serialize(dept) for dept in departments]
         
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": total_records,
-                "page": page,
-                "page_size": page_size,
+                **pagination,
+                **sync,
                 "records": response
             }
         })
@@ -170,43 +1499,23 @@ def get_departments():
 
 
 @app.route('/students', methods=['GET'])
+@cached_response
 def get_students():
     try:
-        # Get pagination parameters
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 10))
-        
         # Fetch paginated data
-        students_query = Student.query
-        students, total_records = paginate(students_query, page, page_size)
+        sync = since_fields()
+        students_query, serialize, _ = STUDENT_FIELDS.apply(filter_ids(filter_since(Student.query, Student), Student))
+        students, pagination = fetch_page(students_query.order_by(Student.id), [Student.id])
         
         # Build response
-        response = [
-            {
-                "id": stu.id,
-                "name": stu.name,
-                "dept_name": stu.dept_name,
-                "tot_cred": stu.tot_cred,
-                "courses": [
-                    {
-                        "course_id": take.course_id,
-                        "section_id": take.sec_id,
-                        "semester": take.semester,
-                        "year": take.year,
-                    }
-                    for take in stu.takes
-                ],
-            }
-            for stu in students
-        ]
+        response = [serialize(stu) for stu in students]
         
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": total_records,
-                "page": page,
-                "page_size": page_size,
+                **pagination,
+                **sync,
                 "records": response
             }
         })
@@ -218,43 +1527,43 @@ def get_students():
         })
 
 @app.route('/courses', methods=['GET'])
+@cached_response
 def get_courses():
     try:
-        # Get and validate pagination parameters
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 10))
-
         # Fetch paginated data
-        courses_query = Course.query
-        total_records = courses_query.count()
-        courses = courses_query.offset((page - 1) * page_size).limit(page_size).all()
+        sync = since_fields()
+        courses_query, serialize, includes = COURSE_FIELDS.apply(filter_ids(filter_since(Course.query, Course), Course))
+        courses, pagination = fetch_page(courses_query.order_by(Course.course_id), [Course.course_id])
 
         # Build response
-        response = [
-            {
-                "course_id": course.course_id,
-                "title": course.title,
-                "dept_name": course.dept_name,
-                "credits": course.credits,
-                "instructors": [
+        response = [serialize(course) for course in courses]
+        if "instructors" in includes:
+            # Section.teaches joins on course_id, so load it for the whole page by
+            # course_id; selectinload would use a composite-key IN that SQLite can't index
+            teaches_by_course = {}
+            teaches_query = Teaches.query.options(
+                load_only(Teaches.instructor_id), joinedload(Teaches.instructor).load_only(Instructor.name)
+            ).filter(
+                Teaches.course_id.in_([course.course_id for course in courses])
+            ).order_by(*Teaches.__table__.primary_key.columns)
+            for teach in teaches_query:
+                teaches_by_course.setdefault(teach.course_id, []).append(teach)
+            for record, course in zip(response, courses):
+                record["instructors"] = [
                     {
                         "instructor_id": teach.instructor_id,
                         "name": teach.instructor.name
                     }
-                    for section in course.sections for teach in section.teaches
+                    for section in course.sections for teach in teaches_by_course.get(section.course_id, [])
                 ]
-            }
-            for course in courses
-        ]
 
         # Return paginated response
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": total_records,
-                "page": page,
-                "page_size": page_size,
+                **pagination,
+                **sync,
                 "records": response
             }
         })
@@ -266,23 +1575,21 @@ def get_courses():
         })
 
 @app.route('/time_slots', methods=['GET'])
+@cached_response
 def get_time_slots():
     try:
-        time_slots = TimeSlot.query.all()
-        response = [
-            {
-                "time_slot_id": time_slot.time_slot_id,
-                "day": time_slot.day,
-                "start_time": time_slot.start_time.strftime("%H:%M"),
-                "end_time": time_slot.end_time.strftime("%H:%M"),
-            }
-            for time_slot in time_slots
-        ]
+        sync = since_fields()
+        time_slots_query, serialize, _ = TIME_SLOT_FIELDS.apply(filter_ids(filter_since(TimeSlot.query, TimeSlot), TimeSlot))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(time_slots_query, serialize)
+        time_slots = time_slots_query.all()
+        response = [serialize(time_slot) for time_slot in time_slots]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
                 "total": len(time_slots),
+                **sync,
                 "records": response
             }
         })
@@ -296,32 +1603,21 @@ def get_time_slots():
             }
         })
 @app.route('/instructors', methods=['GET'])
+@cached_response
 def get_instructors():
     try:
-        instructors = Instructor.query.all()
-        response = [
-            {
-                "id": instructor.id,
-                "name": instructor.name,
-                "dept_name": instructor.dept_name,
-                "salary": instructor.salary,
-                "courses": [
-                    {
-                        "course_id": teach.course_id,
-                        "section": teach.sec_id,
-                        "semester": teach.semester,
-                        "year": teach.year,
-                    }
-                    for teach in instructor.teaches
-                ],
-            }
-            for instructor in instructors
-        ]
+        sync = since_fields()
+        instructors_query, serialize, _ = INSTRUCTOR_FIELDS.apply(filter_ids(filter_since(Instructor.query, Instructor), Instructor))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(instructors_query, serialize)
+        instructors = instructors_query.all()
+        response = [serialize(instructor) for instructor in instructors]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
                 "total": len(instructors),
+                **sync,
                 "records": response
             }
         })
@@ -336,32 +1632,28 @@ def get_instructors():
         })
         
 @app.route('/advisors', methods=['GET'])
+@cached_response
 def get_advisors():
     try:
-        advisors = Advisor.query.all()
-        print(f"Advisors: {advisors}")  # Debugging print
+        sync = since_fields()
+        advisors_query, serialize, _ = ADVISOR_FIELDS.apply(filter_ids(filter_since(Advisor.query, Advisor), Advisor))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(advisors_query, serialize)
+        advisors = advisors_query.all()
 
-        response = [
-            {
-                "student_id": advisor.s_id,
-                "student_name": advisor.student.name if advisor.student else None,
-                "instructor_id": advisor.i_id,
-                "instructor_name": advisor.instructor.name if advisor.instructor else None,
-            }
-            for advisor in advisors
-        ]
-        print(f"Response: {response}")  # Debugging print
+        response = [serialize(advisor) for advisor in advisors]
 
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
                 "total": len(advisors),
+                **sync,
                 "records": response
             }
         })
-    except Exception as e:
-        print(f"Error: {e}")  # Debugging print
+    except Exception:
+        app.logger.exception("GET /advisors failed")
         return jsonify({
             "code": 0,
             "msg": "Error",
@@ -371,24 +1663,26 @@ def get_advisors():
             }
         })
 
+@app.route('/advisors', methods=['POST', 'PATCH'])
+def write_advisors():
+    return bulk_write_response('advisor')
 
 @app.route('/classrooms', methods=['GET'])
+@cached_response
 def get_classrooms():
     try:
-        classrooms = Classroom.query.all()
-        response = [
-            {
-                "building": classroom.building,
-                "room_no": classroom.room_no,
-                "capacity": classroom.capacity,
-            }
-            for classroom in classrooms
-        ]
+        sync = since_fields()
+        classrooms_query, serialize, _ = CLASSROOM_FIELDS.apply(filter_ids(filter_since(Classroom.query, Classroom), Classroom))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(classrooms_query, serialize)
+        classrooms = classrooms_query.all()
+        response = [serialize(classroom) for classroom in classrooms]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
                 "total": len(classrooms),
+                **sync,
                 "records": response
             }
         })
@@ -402,28 +1696,27 @@ def get_classrooms():
             }
         })
 @app.route('/sections', methods=['GET'])
+@cached_response
 def get_sections():
     try:
-        sections = Section.query.all()
-        response = [
-            {
-                "course_id": section.course_id,
-                "sec_id": section.sec_id,
-                "semester": section.semester,
-                "year": section.year,
-                "building": section.building,
-                "room_no": section.room_no,
-                "time_slot": {
-                    "time_slot_id": section.time_slot_id,
-                } if section.time_slot else None,
-            }
-            for section in sections
-        ]
+        sync = since_fields()
+        sections_query, serialize, _ = SECTION_FIELDS.apply(filter_ids(filter_since(Section.query, Section), Section))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(sections_query, serialize)
+        if 'cursor' in request.args:
+            sections, pagination = fetch_page(sections_query, [
+                Section.course_id, Section.sec_id, Section.semester, Section.year
+            ])
+        else:
+            sections = sections_query.all()
+            pagination = {"total": len(sections)}
+        response = [serialize(section) for section in sections]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": len(sections),
+                **pagination,
+                **sync,
                 "records": response
             }
         })
@@ -437,21 +1730,21 @@ def get_sections():
             }
         })
 @app.route('/prerequisites', methods=['GET'])
+@cached_response
 def get_prerequisites():
     try:
-        prereqs = Prereq.query.all()
-        response = [
-            {
-                "course_id": prereq.course_id,
-                "prereq_id": prereq.prereq_id,
-            }
-            for prereq in prereqs
-        ]
+        sync = since_fields()
+        prereqs_query, serialize, _ = PREREQ_FIELDS.apply(filter_ids(filter_since(Prereq.query, Prereq), Prereq))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(prereqs_query, serialize)
+        prereqs = prereqs_query.all()
+        response = [serialize(prereq) for prereq in prereqs]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
                 "total": len(prereqs),
+                **sync,
                 "records": response
             }
         })
@@ -465,31 +1758,102 @@ def get_prerequisites():
             }
         })
 
+def prereq_graph_response(course_id, from_column, to_column):
+    """Courses linked to `course_id` in prereq_closure, read from one index range."""
+    direct = db.session.query(Prereq).filter(
+        Prereq.course_id == PrereqClosure.course_id, Prereq.prereq_id == PrereqClosure.prereq_id
+    ).exists()
+    rows = db.session.query(to_column, Course.title, direct).outerjoin(
+        Course, Course.course_id == to_column
+    ).filter(from_column == course_id).order_by(to_column).all()
+    response = [
+        {"course_id": linked_id, "title": title, "direct": is_direct}
+        for linked_id, title, is_direct in rows if linked_id != course_id
+    ]
+    return jsonify({
+        "code": 1,
+        "msg": "Success",
+        "data": {
+            "course_id": course_id,
+            "total": len(response),
+            "in_cycle": len(response) < len(rows),
+            "records": response
+        }
+    })
+
+@app.route('/courses/<course_id>/prerequisites', methods=['GET'])
+@cached_response
+def get_course_prerequisites(course_id):
+    try:
+        # Every course that must be taken before course_id
+        return prereq_graph_response(course_id, PrereqClosure.course_id, PrereqClosure.prereq_id)
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/courses/<course_id>/unlocks', methods=['GET'])
+@cached_response
+def get_course_unlocks(course_id):
+    try:
+        # Every course that needs course_id, directly or through other prerequisites
+        return prereq_graph_response(course_id, PrereqClosure.prereq_id, PrereqClosure.course_id)
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/prerequisites/cycles', methods=['GET'])
+@cached_response
+def get_prerequisite_cycles():
+    try:
+        cycles = find_prereq_cycles()
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(cycles),
+                "records": cycles
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
 @app.route('/takes', methods=['GET'])
+@cached_response
 def get_takes():
     try:
-        takes = Takes.query.all()
-        response = [
-            {
-                "student_id": take.student_id,
-                "course_id": take.course_id,
-                "section_id": take.sec_id,
-                "semester": take.semester,
-                "year": take.year,
-                "grade": take.grade
-            }
-            for take in takes
-        ]
+        sync = since_fields()
+        takes_query, serialize, _ = TAKE_FIELDS.apply(filter_ids(filter_since(Takes.query, Takes), Takes))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(takes_query, serialize)
+        if 'cursor' in request.args:
+            takes, pagination = fetch_page(takes_query, [
+                Takes.student_id, Takes.course_id, Takes.sec_id, Takes.semester, Takes.year
+            ])
+        else:
+            takes = takes_query.all()
+            pagination = {"total": len(takes)}
+        response = [serialize(take) for take in takes]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": len(takes),
+                **pagination,
+                **sync,
                 "records": response
             }
         })
-    except Exception as e:
-        print(f"Error: {e}")  # Debugging print
+    except Exception:
+        app.logger.exception("GET /takes failed")
         return jsonify({
             "code": 0,
             "msg": "Error",
@@ -500,24 +1864,153 @@ def get_takes():
         })
 
 @app.route('/teaches', methods=['GET'])
+@cached_response
 def get_teaches():
     try:
-        teaches_records = Teaches.query.all()
+        sync = since_fields()
+        teaches_query, serialize, _ = TEACH_FIELDS.apply(filter_ids(filter_since(Teaches.query, Teaches), Teaches))
+        if request.args.get('stream') == 'ndjson':
+            return stream_ndjson(teaches_query, serialize)
+        teaches_records = teaches_query.all()
+        response = [serialize(teach) for teach in teaches_records]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(teaches_records),
+                **sync,
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "data": {
+                "total": 0,
+                "records": []
+            }
+        })
+
+@app.route('/takes', methods=['POST', 'PATCH'])
+def write_takes():
+    return bulk_write_response('takes')
+
+@app.route('/teaches', methods=['POST', 'PATCH'])
+def write_teaches():
+    return bulk_write_response('teaches')
+
+@app.route('/deletions', methods=['GET'])
+@cached_response
+def get_deletions():
+    try:
+        # Read the version first: a delete committed meanwhile is picked up next time
+        version = current_row_version()
+        since = int(request.args.get('since', 0))
+        deletions = DeletedRecord.query.filter(
+            DeletedRecord.version > since, DeletedRecord.version <= version
+        ).order_by(DeletedRecord.id).all()
+        response = [
+            {"table": record.table_name, "key": json.loads(record.record_key), "version": record.version}
+            for record in deletions
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(deletions),
+                "version": version,
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/schedule/conflicts', methods=['GET'])
+@cached_response
+def get_schedule_conflicts():
+    try:
+        kinds = request.args.get('kind', 'room,instructor,student').split(',')
+        conflicts = [
+            conflict for kind in kinds
+            for conflict in find_schedule_conflicts(kind, request.args.get('semester'), request.args.get('year'))
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(conflicts),
+                "records": conflicts
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/schedule/check', methods=['GET'])
+@cached_response
+def check_enrollment():
+    try:
+        # Would enrolling student_id in this section clash with their other sections?
+        args = request.args
+        conflicts = find_enrollment_conflicts(int(args['student_id']), args['course_id'], int(args['sec_id']),
+                                              args['semester'], int(args['year']))
         response = [
             {
-                "instructor_id": teach.instructor_id,
-                "course_id": teach.course_id,
-                "section_id": teach.sec_id,
-                "semester": teach.semester,
-                "year": teach.year,
+                "course_id": course_id,
+                "sec_id": sec_id,
+                "day": day,
+                "start_time": start.strftime("%H:%M"),
+                "end_time": end.strftime("%H:%M"),
             }
-            for teach in teaches_records
+            for course_id, sec_id, day, start, end in conflicts
         ]
         return jsonify({
             "code": 1,
             "msg": "Success",
             "data": {
-                "total": len(teaches_records),
+                "conflict": bool(response),
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/analytics/gpa', methods=['GET'])
+@cached_response
+def get_gpa():
+    try:
+        # Read from the student_grades summary, never from takes
+        grades_query = filter_ids(StudentGrades.query, StudentGrades).options(
+            joinedload(StudentGrades.student)).order_by(StudentGrades.student_id)
+        grades, pagination = fetch_page(grades_query, [StudentGrades.student_id])
+        response = [
+            {
+                "id": summary.student_id,
+                "name": summary.student.name if summary.student else None,
+                "dept_name": summary.student.dept_name if summary.student else None,
+                "courses_graded": summary.courses_graded,
+                "graded_credits": summary.graded_credits,
+                "gpa": round(summary.grade_points / summary.graded_credits, 3) if summary.graded_credits else None,
+            }
+            for summary in grades
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                **pagination,
                 "records": response
             }
         })
@@ -525,216 +2018,843 @@ def get_teaches():
         return jsonify({
             "code": 0,
             "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/analytics/enrollment', methods=['GET'])
+@cached_response
+def get_enrollment():
+    try:
+        # Every section with its head count from section_enrollment and its room's capacity
+        enrollment_query = db.session.query(
+            Section.course_id, Section.sec_id, Section.semester, Section.year, Section.building, Section.room_no,
+            func.coalesce(SectionEnrollment.enrolled, 0).label('enrolled'), Classroom.capacity,
+        ).outerjoin(SectionEnrollment, _section_join(SectionEnrollment)).outerjoin(
+            Classroom, db.and_(Classroom.building == Section.building, Classroom.room_no == Section.room_no)
+        ).order_by(Section.course_id, Section.sec_id, Section.semester, Section.year)
+        if request.args.get('over_capacity') in ('1', 'true'):
+            enrollment_query = enrollment_query.filter(SectionEnrollment.enrolled > Classroom.capacity)
+        enrollment_query = filter_ids(enrollment_query, Section)
+        sections, pagination = fetch_page(enrollment_query, [
+            Section.course_id, Section.sec_id, Section.semester, Section.year
+        ])
+        response = [
+            {
+                "course_id": section.course_id,
+                "sec_id": section.sec_id,
+                "semester": section.semester,
+                "year": section.year,
+                "building": section.building,
+                "room_no": section.room_no,
+                "enrolled": section.enrolled,
+                "capacity": section.capacity,
+                "utilization": round(section.enrolled / section.capacity, 3) if section.capacity else None,
+            }
+            for section in sections
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
             "data": {
-                "total": 0,
-                "records": []
+                **pagination,
+                "records": response
             }
         })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/analytics/salaries', methods=['GET'])
+@cached_response
+def get_salaries():
+    try:
+        # One GROUP BY over instructor, walked in dept_name index order
+        totals = db.session.query(
+            Instructor.dept_name, func.count(), func.sum(Instructor.salary), func.avg(Instructor.salary)
+        ).group_by(Instructor.dept_name).order_by(Instructor.dept_name).all()
+        response = [
+            {"dept_name": dept_name, "instructors": count, "total_salary": total, "average_salary": average}
+            for dept_name, count, total, average in totals
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(response),
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/analytics/teaching_load', methods=['GET'])
+@cached_response
+def get_teaching_load():
+    try:
+        # One GROUP BY over teaches, whose primary key starts with instructor_id
+        load_query = db.session.query(
+            Teaches.instructor_id, Instructor.name, func.count(), func.count(Teaches.course_id.distinct())
+        ).join(Instructor, Instructor.id == Teaches.instructor_id)
+        if request.args.get('semester'):
+            load_query = load_query.filter(Teaches.semester == request.args['semester'])
+        if request.args.get('year'):
+            load_query = load_query.filter(Teaches.year == int(request.args['year']))
+        loads = load_query.group_by(Teaches.instructor_id).order_by(Teaches.instructor_id).all()
+        response = [
+            {"instructor_id": instructor_id, "name": name, "sections": sections, "courses": courses}
+            for instructor_id, name, sections, courses in loads
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": len(response),
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/search', methods=['GET'])
+@cached_response
+def search():
+    try:
+        # ?q=words&kind=course,student,instructor,department, ranked best first
+        kinds = [kind for kind in request.args.get('kind', ','.join(SEARCH_INDEXES)).split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in SEARCH_INDEXES]
+        if unknown:
+            raise ValueError(f"unknown kind: {', '.join(unknown)} (choose from {', '.join(SEARCH_INDEXES)})")
+        page = positive_arg('page', 1)
+        page_size = min(positive_arg('page_size', 10), app.config['SEARCH_MAX_PAGE_SIZE'])
+        if 'q' not in request.args:
+            raise ValueError("missing q: the words to search for")
+        hits, total = search_records(request.args['q'], kinds, page, page_size)
+        response = [
+            {"kind": kind, "id": key, "text": text, "score": score}
+            for kind, key, text, score in hits
+        ]
+        return jsonify({
+            "code": 1,
+            "msg": "Success",
+            "data": {
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "records": response
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Per-route request metrics in the Prometheus text format."""
+    body = "\n".join(metric.render() for metric in METRICS) + "\n"
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+# -------------------------- QUERY PLAN AUDIT --------------------------
+
+def find_full_scans(statement, plan):
+    """Return the plan steps of a statement that scan a whole table.
+
+    Scanning the driving table of an unfiltered list query is expected;
+    a scan inside a join or under a WHERE clause means a missing index.
+    Reading a materialized subquery is not a table scan, and neither is
+    an FTS5 table answering a MATCH (its index string holds an "M").
+    """
+    filtered = " WHERE " in " ".join(statement.split())
+    scans = []
+    for position, row in enumerate(plan):
+        detail = row[-1]
+        if not detail.startswith("SCAN ") or " USING " in detail or "CONSTANT ROW" in detail:
+            continue
+        if detail.startswith("SCAN (subquery-") or re.search(r" VIRTUAL TABLE INDEX \d+:\S*M", detail):
+            continue
+        if position > 0 or filtered:
+            scans.append(detail)
+    return scans
+
+
+# Sample arguments of the GET endpoints that need them, taken from the first row of a table:
+# route -> query selecting one row whose columns are named after the path and query arguments
+ROUTE_SAMPLES = {
+    '/courses/<course_id>/prerequisites': "SELECT course_id FROM prereq ORDER BY course_id LIMIT 1",
+    '/courses/<course_id>/unlocks': "SELECT prereq_id AS course_id FROM prereq ORDER BY prereq_id LIMIT 1",
+    '/schedule/check': "SELECT student_id, course_id, sec_id, semester, year FROM takes LIMIT 1",
+    '/search': "SELECT substr(title, 1, instr(title || ' ', ' ') - 1) AS q FROM course ORDER BY course_id LIMIT 1",
+    '/snapshot/<table_name>': "SELECT 'takes' AS table_name",
+}
+
+
+def list_get_routes():
+    """URLs of the GET endpoints (everything but / and static), with ROUTE_SAMPLES filled in.
+
+    A route that needs arguments but has no sample, or whose sample table
+    is empty, is left out.
+    """
+    adapter = app.url_map.bind('localhost')
+    urls = []
+    with db.engine.connect() as conn:
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint in ('home', 'static'):
+                continue
+            values = {}
+            if rule.rule in ROUTE_SAMPLES:
+                row = conn.exec_driver_sql(ROUTE_SAMPLES[rule.rule]).mappings().first()
+                if row is None:
+                    continue
+                values = dict(row)
+            elif rule.arguments:
+                continue
+            urls.append(adapter.build(rule.endpoint, values))
+    return sorted(urls)
+
+
+def explain_endpoints():
+    """Call every GET endpoint once (see list_get_routes()) and EXPLAIN QUERY PLAN each SQL statement it ran.
+
+    Returns (route, statement, plan rows, flagged full scans) tuples.
+    """
+    routes = list_get_routes()
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((current_route, statement, parameters))
+
+    client = app.test_client()
+    event.listen(Engine, 'before_cursor_execute', capture)
+    try:
+        for current_route in routes:
+            invalidate_caches()  # make sure the endpoint really runs its queries
+            client.get(current_route)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', capture)
+
+    report = []
+    with db.engine.connect() as conn:
+        for route, statement, parameters in executed:
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            report.append((route, statement, plan, find_full_scans(statement, plan)))
+    return report
+
+
+@app.cli.command('explain')
+def explain_command():
+    """Print the query plan of every endpoint and fail on unexpected full scans."""
+    flagged = 0
+    for route, statement, plan, scans in explain_endpoints():
+        print(f"{route}: {' '.join(statement.split())}")
+        for row in plan:
+            print(f"    {row[-1]}")
+        for detail in scans:
+            print(f"    !! full scan: {detail}")
+        flagged += len(scans)
+    if flagged:
+        print(f"{flagged} full table scan(s) found")
+        raise SystemExit(1)
+    print("No unexpected full table scans.")
 
 # -------------------------- Loading DATA --------------------------
 
 
-def load_data():
+def parse_slot_time(value):
+    """Parse a time_slot.csv time such as "9:00", "1:00", "13:00" or "1:00 PM".
+
+    "%I:%M" read "1:00" as 01:00 and "12:00" as midnight, so afternoon
+    slots ended before they started.
+    """
+    text = value.strip().upper()
+    meridiem = text[-2:] if text.endswith(('AM', 'PM')) else None
+    if meridiem:
+        text = text[:-2].strip()
+    hour, minute = (int(part) for part in text.split(':'))
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem == 'PM' else 0)
+    elif hour < app.config['SLOT_PM_BEFORE_HOUR']:
+        hour += 12
+    return dtime(hour, minute)
+
+
+# CSV files in load order: (label, file name, model, CSV -> column renames, converters)
+CSV_TABLES = [
+    ("Departments", "department.csv", Department, {}, {}),
+    ("Students", "student.csv", Student, {"ID": "id"}, {}),
+    ("Courses", "course.csv", Course, {}, {}),
+    ("Instructors", "instructor.csv", Instructor, {"ID": "id"}, {}),
+    ("Advisors", "advisor.csv", Advisor, {}, {}),
+    ("Classrooms", "classroom.csv", Classroom, {}, {}),
+    ("Prerequisites", "prereq.csv", Prereq, {"prerq_id": "prereq_id"}, {}),
+    ("Time Slots", "time_slot.csv", TimeSlot, {},
+     {"start_time": parse_slot_time, "end_time": parse_slot_time}),
+    ("Sections", "section.csv", Section, {}, {}),
+    ("Takes", "takes.csv", Takes, {"ID": "student_id"}, {}),
+    ("Teaches", "teaches.csv", Teaches, {"ID": "instructor_id"}, {}),
+]
+
+
+def load_csv_table(conn, path, model, renames, converters, chunk_size, target=None, extra=None):
+    """Bulk insert one CSV into a model's table (or `target`), skipping rows whose key exists.
+
+    The file is read in chunks and each chunk goes to the driver as a
+    single executemany INSERT ... ON CONFLICT DO NOTHING of plain tuples,
+    bypassing per-row ORM and dict overhead. `extra` maps columns missing
+    from the CSV to a value set on every row.
+    """
+    extra = extra or {}
+    table = model.__table__
+    target = target or table.name
+    total = 0
+    # Read everything as text; SQLite column affinity stores numbers as numbers
+    for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_size):
+        chunk = chunk.rename(columns=renames)
+        columns = [column for column in chunk.columns if column in table.c]
+        chunk = chunk[columns].astype(object)
+        for column in columns:
+            convert = converters.get(column)
+            process = table.c[column].type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+            if convert:
+                chunk[column] = chunk[column].map(convert, na_action='ignore')
+            if process:
+                chunk[column] = chunk[column].map(process, na_action='ignore')
+        for column, value in extra.items():
+            chunk[column] = value
+        columns += list(extra)
+        rows = list(chunk.where(chunk.notna(), None).itertuples(index=False, name=None))
+        if rows:
+            conn.exec_driver_sql(
+                f"INSERT INTO {target} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) ON CONFLICT DO NOTHING",
+                rows,
+            )
+        total += len(rows)
+    return total
+
+
+def sync_csv_table(conn, path, model, renames, converters, chunk_size):
+    """Make a model's table match one CSV, stamping inserted and updated rows with a new row version.
+
+    The CSV is bulk loaded into a temporary staging table and applied with
+    set-based statements: rows missing from the CSV become tombstones and
+    are deleted, the rest are upserted, and rows whose values did not
+    change keep their old version. Rows written through the bulk API
+    (origin 'api') are the API's: the CSV neither updates nor deletes them.
+    Returns (rows read, rows changed, rows deleted).
+    """
+    table = model.__table__
+    staging = f"staging_{table.name}"
+    keys = [column.name for column in table.primary_key.columns]
+    values = [column.name for column in table.columns
+              if column.name not in keys and column.name not in ('row_version', 'origin')]
+    columns = keys + values
+    joined = " AND ".join(f"staged.{key} = {table.name}.{key}" for key in keys)
+    differs = " OR ".join(f"{table.name}.{column} IS NOT staged.{column}" for column in values)
+    owned = f"{table.name}.origin = 'csv'" if 'origin' in table.c else "true"
+    missing = f"{owned} AND NOT EXISTS (SELECT 1 FROM temp.{staging} AS staged WHERE {joined})"
+
+    version = next_row_version(conn)
+    # FTS5 flushes its pending tokens after every statement, so a table with a
+    # search index is filled by one INSERT ... SELECT, never row by row
+    searchable = any(indexed.__table__ is table for indexed, _, _ in SEARCH_INDEXES.values())
+    if not searchable and conn.exec_driver_sql(f"SELECT 1 FROM {table.name} LIMIT 1").scalar() is None:
+        # Nothing to diff against: load straight into the table
+        count = load_csv_table(conn, path, model, renames, converters, chunk_size, extra={'row_version': version})
+        changed = conn.exec_driver_sql(f"SELECT count(*) FROM {table.name}").scalar()
+        if table.name in PARENT_LINKS:
+            record_parent_changes(conn, table.name, f"SELECT * FROM {table.name}")
+        touch_parent_records(conn, version)
+        run_table_change_hooks(conn, table.name, version)
+        return count, changed, 0
+
+    # Same column affinities as the real table, first row per key wins like a plain insert
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS temp.{staging}")
+    conn.exec_driver_sql(f"CREATE TEMP TABLE {staging} AS SELECT * FROM {table.name} WHERE 0")
+    conn.exec_driver_sql(f"CREATE UNIQUE INDEX temp.ix_{staging} ON {staging} ({', '.join(keys)})")
+    count = load_csv_table(conn, path, model, renames, converters, chunk_size, target=staging)
+
+    # Parents that embedded the old state of updated or deleted rows
+    if table.name in PARENT_LINKS:
+        record_parent_changes(conn, table.name, (
+            f"SELECT {table.name}.* FROM {table.name} LEFT JOIN temp.{staging} AS staged ON {joined} "
+            f"WHERE {owned} AND (staged.{keys[0]} IS NULL" + (f" OR {differs}" if values else "") + ")"
+        ))
+    conn.exec_driver_sql(
+        f"INSERT INTO deleted_record (table_name, record_key, version) "
+        f"SELECT ?, json_array({', '.join(keys)}), ? FROM {table.name} WHERE {missing}",
+        (table.name, version),
+    )
+    deleted = conn.exec_driver_sql(f"DELETE FROM {table.name} WHERE {missing}").rowcount
+
+    # WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+    upsert = (
+        f"INSERT INTO {table.name} ({', '.join(columns)}, row_version) "
+        f"SELECT {', '.join(columns)}, ? FROM temp.{staging} WHERE true "
+        f"ON CONFLICT ({', '.join(keys)}) "
+    )
+    if values:
+        upsert += (
+            f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in values)}, "
+            f"row_version = excluded.row_version "
+            f"WHERE {owned} AND ({differs.replace('staged.', 'excluded.')})"
+        )
+    else:
+        upsert += "DO NOTHING"
+    conn.exec_driver_sql(upsert, (version,))
+    changed = conn.exec_driver_sql(
+        f"SELECT count(*) FROM {table.name} WHERE row_version = ?", (version,)
+    ).scalar()
+    if table.name in PARENT_LINKS:
+        record_parent_changes(conn, table.name, f"SELECT * FROM {table.name} WHERE row_version = ?", (version,))
+    touch_parent_records(conn, version)
+    run_table_change_hooks(conn, table.name, version)
+    conn.exec_driver_sql(f"DROP TABLE temp.{staging}")
+    return count, changed, deleted
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_file_state(conn, file_name, path):
+    """Compare a CSV with the copy its table was last loaded from.
+
+    Returns (unchanged, manifest row). The checksum is only computed when
+    the size or mtime differ, so an untouched file costs one stat().
+    """
+    stat = os.stat(path)
+    loaded = conn.execute(db.select(SourceFile).where(SourceFile.file_name == file_name)).one_or_none()
+    if loaded is not None and (loaded.size, loaded.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return True, None
+    row = {"file_name": file_name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+    return loaded is not None and loaded.sha256 == row["sha256"], row
+
+
+def record_source_file(conn, row):
+    conn.execute(db.delete(SourceFile).where(SourceFile.file_name == row["file_name"]))
+    conn.execute(db.insert(SourceFile).values(**row))
+
+
+def load_data(data_dir=None, changed_only=False):
+    """Sync every table with its CSV in `data_dir` (default: DATA_DIR), one transaction per table.
+
+    With `changed_only` a table whose CSV is the one it was last loaded
+    from (same size and mtime, or same checksum) is skipped.
+    """
+    invalidate_caches()
+    data_dir = data_dir or app.config['DATA_DIR']
     try:
-        # Load Departments
-        print("Loading Departments...")
-        departments_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/department.csv')
-        for _, row in departments_df.iterrows():
-            if not Department.query.filter_by(dept_name=row['dept_name']).first():
-                db.session.add(Department(
-                    dept_name=row['dept_name'],
-                    building=row['building'],
-                    budget=row['budget']
-                ))
-        db.session.commit()
-        print("Departments loaded successfully!\n")
-
-        # Load Students
-        print("Loading Students...")
-        students_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/student.csv')
-        for _, row in students_df.iterrows():
-            if not Student.query.filter_by(id=row['ID']).first():
-                db.session.add(Student(
-                    id=row['ID'],
-                    name=row['name'],
-                    dept_name=row['dept_name'],
-                    tot_cred=row['tot_cred']
-                ))
-        db.session.commit()
-        print("Students loaded successfully!\n")
-
-        # Load Courses
-        print("Loading Courses...")
-        courses_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/course.csv')
-        for _, row in courses_df.iterrows():
-            if not Course.query.filter_by(course_id=row['course_id']).first():
-                db.session.add(Course(
-                    course_id=row['course_id'],
-                    title=row['title'],
-                    dept_name=row['dept_name'],
-                    credits=row['credits']
-                ))
-        db.session.commit()
-        print("Courses loaded successfully!\n")
-
-        # Load Instructors
-        print("Loading Instructors...")
-        instructors_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/instructor.csv')
-        for _, row in instructors_df.iterrows():
-            if not Instructor.query.filter_by(id=row['ID']).first():
-                db.session.add(Instructor(
-                    id=row['ID'],
-                    name=row['name'],
-                    dept_name=row['dept_name'],
-                    salary=row['salary']
-                ))
-        db.session.commit()
-        print("Instructors loaded successfully!\n")
-
-
-        print("Loading Advisors...")
-        advisors_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/advisor.csv')
-        for _, row in advisors_df.iterrows():
-            if not Advisor.query.filter_by(s_id=int(row['s_id']), i_id=int(row['i_id'])).first():
-                db.session.add(Advisor(
-                    s_id=int(row['s_id']),
-                    i_id=int(row['i_id'])
-                ))
-        db.session.commit()
-        print("Advisors loaded successfully!\n")
-
-
-
-
-        # Load Classrooms
-        print("Loading Classrooms...")
-        classrooms_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/classroom.csv')
-        for _, row in classrooms_df.iterrows():
-            if not Classroom.query.filter_by(building=row['building'], room_no=row['room_no']).first():
-                db.session.add(Classroom(
-                    building=row['building'],
-                    room_no=row['room_no'],
-                    capacity=row['capacity']
-                ))
-        db.session.commit()
-        print("Classrooms loaded successfully!\n")
-
-        # Load Prerequisites
-        print("Loading Prerequisites...")
-        prereqs_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/prereq.csv')
-        for _, row in prereqs_df.iterrows():
-            if not Prereq.query.filter_by(course_id=row['course_id'], prereq_id=row['prerq_id']).first():
-                db.session.add(Prereq(
-                    course_id=row['course_id'],
-                    prereq_id=row['prerq_id']
-                ))
-        db.session.commit()
-        print("Prerequisites loaded successfully!\n")
-
-        # Load Sections
-        print("Loading Sections...")
-        sections_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/section.csv')
-        for _, row in sections_df.iterrows():
-            if not Section.query.filter_by(course_id=row['course_id'], sec_id=row['sec_id'], semester=row['semester'], year=row['year']).first():
-                db.session.add(Section(
-                    course_id=row['course_id'],
-                    sec_id=row['sec_id'],
-                    semester=row['semester'],
-                    year=row['year'],
-                    building=row['building'],
-                    room_no=row['room_no'],
-                    time_slot_id=row['time_slot_id']
-                ))
-        db.session.commit()
-        print("Sections loaded successfully!\n")
-
-        # Load Takes
-        print("Loading Takes...")
-        takes_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/takes.csv')
-        for _, row in takes_df.iterrows():
-            if not Takes.query.filter_by(student_id=row['ID'], course_id=row['course_id'], sec_id=row['sec_id'], semester=row['semester'], year=row['year']).first():
-                db.session.add(Takes(
-                    student_id=row['ID'],
-                    course_id=row['course_id'],
-                    sec_id=row['sec_id'],
-                    semester=row['semester'],
-                    year=row['year'],
-                    grade=row['grade']
-                ))
-        db.session.commit()
-        print("Takes loaded successfully!\n")
-
-        # Load Teaches
-        print("Loading Teaches...")
-        teaches_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/teaches.csv')
-        for _, row in teaches_df.iterrows():
-            if not Teaches.query.filter_by(instructor_id=row['ID'], course_id=row['course_id'], sec_id=row['sec_id'], semester=row['semester'], year=row['year']).first():
-                db.session.add(Teaches(
-                    instructor_id=row['ID'],
-                    course_id=row['course_id'],
-                    sec_id=row['sec_id'],
-                    semester=row['semester'],
-                    year=row['year']
-                ))
-        db.session.commit()
-        print("Teaches loaded successfully!\n")
-
-        # Load Time Slots
-        print("Loading Time Slots...")
-        time_slots_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/time_slot.csv')
-        for _, row in time_slots_df.iterrows():
-            try:
-                # Convert string times to Python time objects
-                start_time = datetime.strptime(row['start_time'], "%I:%M").time()
-                end_time = datetime.strptime(row['end_time'], "%I:%M").time()
-
-                # Check if the record exists and insert if it doesn't
-                if not TimeSlot.query.filter_by(time_slot_id=row['time_slot_id']).first():
-                    db.session.add(TimeSlot(
-                        time_slot_id=row['time_slot_id'],
-                        day=row['day'],
-                        start_time=start_time,
-                        end_time=end_time
-                    ))
-            except Exception as e:
-                print(f"Error processing time slot {row}: {e}")
-        db.session.commit()
-        print("Time Slots loaded successfully!\n")
+        with db.engine.connect() as conn:
+            for label, file_name, model, renames, converters in CSV_TABLES:
+                path = os.path.join(data_dir, file_name)
+                with conn.begin():
+                    unchanged, row = source_file_state(conn, file_name, path)
+                    if changed_only and unchanged:
+                        if row:
+                            record_source_file(conn, row)  # touched but identical: remember the new mtime
+                        print(f"{label} unchanged, skipped.")
+                        continue
+                    print(f"Loading {label}...")
+                    count, changed, deleted = sync_csv_table(conn, path, model, renames, converters,
+                                                             app.config['CSV_CHUNK_SIZE'])
+                    if row:
+                        record_source_file(conn, row)
+                print(f"{label} loaded successfully! ({count} rows read, {changed} changed, {deleted} deleted)\n")
 
         print("All data loaded successfully!")
 
     except Exception as e:
         print(f"Error in load_data: {e}")
-        
-        
-        print("Loading Takes...")
-        takes_df = pd.read_csv('/Users/venkatasaivardhanbora/Desktop/APIproject/takes.csv')
-        for _, row in takes_df.iterrows():
-            if not Takes.query.filter_by(
-                student_id=row['ID'],
-                course_id=row['course_id'],
-                sec_id=row['sec_id'],
-                semester=row['semester'],
-                year=row['year']
-            ).first():
-                db.session.add(Takes(
-                    student_id=row['ID'],
-                    course_id=row['course_id'],
-                    sec_id=row['sec_id'],
-                    semester=row['semester'],
-                    year=row['year'],
-                    grade=row.get('grade')  # Handle missing grade values
-                ))
-        db.session.commit()
-        print("Takes loaded successfully!\n")
+    finally:
+        invalidate_caches()
+
+# -------------------------- PERSISTENT DATABASE --------------------------
+
+
+def schema_version():
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def prepare_database(data_dir=None, rebuild=False):
+    """Get the database ready to serve, doing only the work that is needed.
+
+    The tables are dropped and rebuilt from scratch only with `rebuild` or
+    when they were created for another SCHEMA_VERSION. Otherwise only the
+    tables whose CSV changed since it was last loaded are synced, so a
+    restart with unchanged data does no loading at all.
+    """
+    version = schema_version()
+    if rebuild or version != SCHEMA_VERSION:
+        print(f"Building the database (schema version {version} -> {SCHEMA_VERSION})...")
+        db.drop_all()  # Reset database tables
+        db.create_all()  # Create fresh tables
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    load_data(data_dir, changed_only=True)
+
+
+def backup_database(path):
+    """Write a consistent copy of the database to `path` with SQLite's online backup."""
+    with db.engine.connect() as conn:
+        target = sqlite3.connect(path)
+        try:
+            conn.connection.driver_connection.backup(target)
+        finally:
+            target.close()
+
+
+def restore_database(path):
+    """Replace the database with a copy of the SQLite file at `path` (e.g. one written by `flask backup`).
+
+    The restored copy is then treated like any persistent database: its
+    schema version and CSV manifest decide what prepare_database() redoes.
+    """
+    db.engine.dispose()
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        with db.engine.connect() as conn:
+            source.backup(conn.connection.driver_connection)
+    finally:
+        source.close()
+    if _readonly_engine is not None:
+        _readonly_engine.dispose()
+    invalidate_caches()
+
+
+@app.cli.command('backup')
+@click.argument('path')
+def backup_command(path):
+    """Copy the database to PATH, for a later --restore."""
+    backup_database(path)
+    print(f"Database (schema version {schema_version()}) copied to {path}")
+
+# -------------------------- SNAPSHOT EXPORT --------------------------
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only the snapshot export needs pyarrow
+    pa = pq = None
+
+# File extension of each snapshot format: Parquet for predicate pushdown, Arrow IPC for memory mapping
+SNAPSHOT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def arrow_schema(table):
+    """Arrow schema of a model table, one field per column."""
+    types = {int: pa.int64(), float: pa.float64(), str: pa.string(), dtime: pa.time64('us')}
+    return pa.schema([
+        pa.field(column.name, types[column.type.python_type], nullable=column.nullable and not column.primary_key)
+        for column in table.columns
+    ])
+
+
+def iter_record_batches(conn, table, schema, batch_size):
+    """Yield a table as Arrow record batches of at most `batch_size` rows, in primary-key order.
+
+    Rows come from the cursor one batch at a time. Writing them sorted by
+    key gives each Parquet row group tight min/max statistics on it.
+    """
+    result = conn.execution_options(yield_per=batch_size).execute(
+        table.select().order_by(*table.primary_key.columns)
+    )
+    for rows in result.partitions():
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+
+def open_snapshot_writer(sink, schema, fmt):
+    """Writer of one snapshot file; every write_batch() adds one Parquet row group or Arrow batch."""
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression='zstd')
+    return pa.ipc.new_file(sink, schema)
+
+
+def check_snapshot_format(fmt):
+    if pa is None:
+        raise RuntimeError("snapshot export needs pyarrow (pip install pyarrow)")
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"unknown format: {fmt} (choose from {', '.join(SNAPSHOT_FORMATS)})")
+
+
+def export_snapshot(out_dir, fmt='parquet', batch_size=None):
+    """Write every table to `out_dir` as <table>.parquet or <table>.arrow, then snapshot.json.
+
+    All tables are read in one transaction, so the files agree with each
+    other and with the row version in the manifest. Each file is written
+    under a temporary name and renamed once complete. Returns the manifest.
+    """
+    check_snapshot_format(fmt)
+    batch_size = batch_size or app.config['SNAPSHOT_BATCH_SIZE']
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"format": fmt, "exported_at": datetime.now().isoformat(timespec='seconds'), "tables": {}}
+    with db.engine.connect() as conn, conn.begin():
+        manifest["version"] = conn.exec_driver_sql("SELECT version FROM sync_state WHERE id = 1").scalar() or 0
+        for table in db.metadata.sorted_tables:
+            path = os.path.join(out_dir, table.name + SNAPSHOT_FORMATS[fmt])
+            rows = 0
+            schema = arrow_schema(table)
+            writer = open_snapshot_writer(path + '.tmp', schema, fmt)
+            try:
+                for batch in iter_record_batches(conn, table, schema, batch_size):
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+            finally:
+                writer.close()
+            os.replace(path + '.tmp', path)
+            manifest["tables"][table.name] = rows
+            print(f"{table.name}: {rows} rows")
+    with open(os.path.join(out_dir, 'snapshot.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ChunkSink:
+    """Write-only file object that hands what a snapshot writer wrote to a streamed response."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+@app.route('/snapshot/<table_name>', methods=['GET'])
+def get_snapshot(table_name):
+    """Stream one table as a Parquet (default) or Arrow IPC file, ?format=parquet|arrow.
+
+    The body goes out one record batch at a time; X-Row-Version tells
+    which row version the file reflects.
+    """
+    try:
+        fmt = request.args.get('format', 'parquet')
+        check_snapshot_format(fmt)
+        table = db.metadata.tables.get(table_name)
+        if table is None:
+            raise ValueError(f"unknown table: {table_name}")
+        batch_size = int(request.args.get('batch_size', app.config['SNAPSHOT_BATCH_SIZE']))
+        conn = db.engine.connect()
+        transaction = conn.begin()
+        version = conn.exec_driver_sql("SELECT version FROM sync_state WHERE id = 1").scalar() or 0
+    except Exception as e:
+        return jsonify({
+            "code": 0,
+            "msg": "Error",
+            "error": str(e)
+        })
+
+    def generate():
+        # The connection stays open, in one read transaction, until the last batch is sent
+        try:
+            sink = ChunkSink()
+            schema = arrow_schema(table)
+            writer = open_snapshot_writer(sink, schema, fmt)
+            for batch in iter_record_batches(conn, table, schema, batch_size):
+                writer.write_batch(batch)
+                yield sink.drain()
+            writer.close()
+            yield sink.drain()
+        finally:
+            transaction.rollback()
+            conn.close()
+
+    return app.response_class(generate(), mimetype='application/vnd.apache.parquet' if fmt == 'parquet'
+                              else 'application/vnd.apache.arrow.file', headers={
+        "Content-Disposition": f"attachment; filename={table_name}{SNAPSHOT_FORMATS[fmt]}",
+        "X-Row-Version": str(version),
+    })
+
+
+@app.cli.command('snapshot')
+@click.argument('out_dir')
+@click.option('--format', 'fmt', type=click.Choice(list(SNAPSHOT_FORMATS)), default='parquet')
+@click.option('--batch-size', type=int, default=None, help="Rows per record batch / row group.")
+def snapshot_command(out_dir, fmt, batch_size):
+    """Export every table to OUT_DIR as Parquet or Arrow files."""
+    manifest = export_snapshot(out_dir, fmt, batch_size)
+    print(f"Snapshot of row version {manifest['version']} written to {out_dir}")
+
+# -------------------------- ASGI SERVING --------------------------
+
+_asgi_executor = None
+_asgi_executor_lock = threading.Lock()
+
+
+def get_asgi_executor():
+    """Thread pool the views run on in ASGI mode, created on first use."""
+    global _asgi_executor
+    with _asgi_executor_lock:
+        if _asgi_executor is None:
+            _asgi_executor = ThreadPoolExecutor(app.config['ASGI_WORKER_THREADS'], thread_name_prefix='asgi')
+        return _asgi_executor
+
+
+def asgi_environ(scope, body):
+    """WSGI environ of an ASGI HTTP request whose body has been read."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+        value = value.decode('latin-1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is already whole, so its length is known even for a chunked request
+    environ.pop('HTTP_TRANSFER_ENCODING', None)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def run_wsgi_view(environ):
+    """Call the Flask app and read its response up to ASGI_BUFFER_BYTES.
+
+    Returns (status, headers, buffered chunks, rest of the body iterator or None).
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+
+    result = app.wsgi_app(environ, start_response)
+    chunks, size = [], 0
+    iterator = iter(result)
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= app.config['ASGI_BUFFER_BYTES']:
+            return started['status'], started['headers'], chunks, (result, iterator)
+    if hasattr(result, 'close'):
+        result.close()
+    return started['status'], started['headers'], chunks, None
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point serving the same routes as the Flask app.
+
+    The event loop reads requests and writes responses, so a slow client
+    costs a socket and a coroutine, not a thread. Views, and with them all
+    database access, run on the ASGI_WORKER_THREADS pool, which bounds how
+    many requests query SQLite at once. Most responses are produced in one
+    pool call. A streamed response (?stream=ndjson, /snapshot) gives the
+    thread back after every chunk.
+    """
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    loop = asyncio.get_running_loop()
+    executor = get_asgi_executor()
+    # One context per request: a streamed view keeps its request context across pool threads
+    context = contextvars.copy_context()
+    status, headers, chunks, rest = await loop.run_in_executor(
+        executor, context.run, run_wsgi_view, asgi_environ(scope, bytes(body))
+    )
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    if rest is None:
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+        return
+    result, iterator = rest
+    try:
+        await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+        while True:
+            chunk = await loop.run_in_executor(executor, context.run, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(executor, context.run, result.close)
 
 # -------------------------- RUNNING APPLICATION --------------------------
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bring the university database up to date with the CSVs and serve the API.")
+    parser.add_argument('--rebuild', action='store_true', help="drop every table and reload all CSVs")
+    parser.add_argument('--restore', metavar='FILE', help="start from this SQLite backup (flask backup FILE)")
+    parser.add_argument('--asgi', action='store_true', help="serve asgi_app with uvicorn instead of the Flask dev server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
     with app.app_context():  # Ensure app context is active
-        db.drop_all()  # Reset database tables
-        db.create_all()  # Create fresh tables
-        load_data()  # Load data into the database
-    app.run(debug=True)
+        if args.restore:
+            restore_database(args.restore)
+        prepare_database(rebuild=args.rebuild)  # Load only what changed since the last run
+    if args.asgi:
+        import uvicorn  # only ASGI mode needs it
+        uvicorn.run(asgi_app, host=args.host, port=args.port, log_level='warning')
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
 
 
 
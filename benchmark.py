@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import generate_data
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app1 Final submission copy.py")
+
+
+def load_app_module(database_uri, profile="default"):
+    """Import the Flask app file (its name is not importable) against `database_uri`."""
+    os.environ["UNIVERSITY_DATABASE_URI"] = database_uri
+    os.environ["UNIVERSITY_DB_PROFILE"] = profile
+    spec = importlib.util.spec_from_file_location("university_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["university_app"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def summarize(samples):
+    """Timing statistics in milliseconds for a list of durations in seconds."""
+    ms = sorted(sample * 1000 for sample in samples)
+    return {
+        "runs": len(ms),
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p99_ms": round(ms[min(len(ms) - 1, len(ms) * 99 // 100)], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def bench_load(app_module, data_dir):
+    """Time a full rebuild of the database from the CSVs in `data_dir`."""
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            app_module.load_data(data_dir)
+        return {"seconds": round(time.perf_counter() - start, 3)}
+
+
+def bench_endpoints(app_module, repeat):
+    """Time every GET endpoint through the test client with the response cache cleared each run.
+
+    Routes that need arguments get the sample values of list_get_routes().
+    A route that does not answer with a success is reported as an error
+    instead of timed, so error paths are never mistaken for the real work.
+    """
+    results = {}
+    client = app_module.app.test_client()
+    with app_module.app.app_context():
+        for route in app_module.list_get_routes():
+            samples = []
+            size = 0
+            for _ in range(repeat):
+                app_module.invalidate_caches()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = client.get(route)
+                    size = len(response.get_data())
+                samples.append(time.perf_counter() - start)
+            if response.mimetype == "application/json" and response.get_json().get("code") != 1:
+                results[route] = {"error": response.get_json().get("error")}
+            else:
+                results[route] = {**summarize(samples), "bytes": size}
+    return results
+
+
+def mongomock_database():
+    """An in-process MongoDB stand-in, patched to run the ReplaceOne batches store_in_mongodb() sends.
+
+    mongomock's own bulk_write rejects the ops of current pymongo versions.
+    """
+    import mongomock
+    from mongomock.collection import Collection
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    Collection.bulk_write = bulk_write
+    return mongomock.MongoClient()
+
+
+def bench_etl(app_module, page_size, max_workers):
+    """Time D_part2.sync_stores() against a local server and in-process stores.
+
+    Reports every pipeline stage (records, busy and waiting seconds) and the
+    peak memory of a second, traced run. The Redis and MongoDB stand-ins
+    (fakeredis, mongomock) are optional; without them the ETL is skipped.
+    """
+    import D_part2
+    from werkzeug.serving import make_server
+
+    try:
+        import fakeredis
+        mongomock_database()
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def sync(stats=None):
+        redis_client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        db = mongomock_database()[D_part2.DATABASE_NAME]
+        with contextlib.redirect_stdout(io.StringIO()):
+            D_part2.sync_stores(redis_client, db, 0, page_size, max_workers, base_url, stats=stats)
+
+    try:
+        stats = {}
+        start = time.perf_counter()
+        sync(stats)
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            sync()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        server.shutdown()
+
+    return {
+        "seconds": round(seconds, 3),
+        "peak_mib": round(peak / 2**20, 1),
+        "stages": {
+            stage.name: {
+                "records": stage.records,
+                "seconds": round(stage.seconds, 3),
+                "records_per_s": round(stage.records / stage.seconds) if stage.seconds else None,
+                "waiting": round(stage.waiting, 3),
+            }
+            for stages in stats.values() for stage in stages
+        },
+    }
+
+
+def _read_loop(app_module, route, deadline, results):
+    client = app_module.app.test_client()
+    done = failed = 0
+    while time.monotonic() < deadline:
+        if client.get(route).get_json().get("code") == 1:
+            done += 1
+        else:
+            failed += 1
+    results.put(("read", done, failed))
+
+
+def _write_loop(app_module, deadline, results):
+    done = 0
+    with app_module.app.app_context():
+        while time.monotonic() < deadline:
+            with app_module.db.engine.begin() as conn:
+                conn.exec_driver_sql("UPDATE takes SET grade = grade")
+            done += 1
+    results.put(("write", done, 0))
+
+
+def bench_concurrent_reads(data_dir, work_dir, profile, processes, seconds, route="/students?page_size=50"):
+    """Read throughput of `processes` forked reader workers while another worker keeps writing.
+
+    Workers are processes, like WSGI workers, so SQLite locking rather than
+    the GIL decides how many reads get through. Runs against a fresh database
+    built with the given engine profile and the response cache disabled.
+    """
+    app_module = load_app_module(f"sqlite:///{os.path.join(work_dir, profile + '.db')}", profile)
+    bench_load(app_module, data_dir)
+    app_module.app.config["RESPONSE_CACHE_SIZE"] = 0
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    deadline = time.monotonic() + seconds
+    workers = [context.Process(target=_read_loop, args=(app_module, route, deadline, results))
+               for _ in range(processes)]
+    workers.append(context.Process(target=_write_loop, args=(app_module, deadline, results)))
+    for worker in workers:
+        worker.start()
+    totals = {"read": 0, "write": 0, "failed": 0}
+    for _ in workers:
+        kind, done, failed = results.get()
+        totals[kind] += done
+        totals["failed"] += failed
+    for worker in workers:
+        worker.join()
+    return {
+        "processes": processes,
+        "seconds": seconds,
+        "requests": totals["read"],
+        "errors": totals["failed"],
+        "requests_per_second": round(totals["read"] / seconds, 1),
+        "writes": totals["write"],
+    }
+
+
+def _serve(app_module, kind, ports):
+    """Serve the app on a free port in this (forked) process: WSGI on werkzeug's threaded server, ASGI on uvicorn."""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    if kind == "wsgi":
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+        ports.put(server.server_port)
+        server.serve_forever()
+    else:
+        import uvicorn
+        import socket
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        ports.put(sock.getsockname()[1])
+        uvicorn.Server(uvicorn.Config(app_module.asgi_app, log_level="error", backlog=4096)).run(sockets=[sock])
+
+
+async def _timed_get(port, route, slow_seconds):
+    """One GET over a new connection; a slow client waits `slow_seconds` between its request line and headers."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {route} HTTP/1.1\r\n".encode())
+        if slow_seconds:
+            await writer.drain()
+            await asyncio.sleep(slow_seconds)
+        writer.write(b"Host: 127.0.0.1\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        return response.split(b" ", 2)[1:2] == [b"200"]
+    finally:
+        writer.close()
+
+
+async def _load_clients(port, route, clients, seconds, slow_seconds):
+    latencies = []
+    errors = 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+
+    async def client():
+        nonlocal errors
+        while loop.time() < deadline:
+            start = loop.time()
+            try:
+                ok = await _timed_get(port, route, slow_seconds)
+            except OSError:
+                ok = False
+            if ok:
+                latencies.append(loop.time() - start)
+            else:
+                errors += 1
+
+    start = loop.time()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors, loop.time() - start
+
+
+def bench_servers(data_dir, work_dir, clients, seconds, slow_seconds=0.0, route="/students?page_size=50"):
+    """Throughput and latency of the WSGI and ASGI serving paths under `clients` concurrent connections.
+
+    Both servers run in a forked process against the same SQLite file with
+    the response cache disabled; the clients are coroutines in this process.
+    With `slow_seconds` every client dawdles that long over its request
+    headers, like a slow mobile client holding a connection open.
+    """
+    app_module = load_app_module(f"sqlite:///{os.path.join(work_dir, 'servers.db')}")
+    bench_load(app_module, data_dir)
+    app_module.app.config["RESPONSE_CACHE_SIZE"] = 0
+    context = multiprocessing.get_context("fork")
+    results = {}
+    for kind in ("wsgi", "asgi"):
+        if kind == "asgi" and importlib.util.find_spec("uvicorn") is None:
+            results[kind] = {"skipped": "uvicorn is not installed"}
+            continue
+        ports = context.Queue()
+        server = context.Process(target=_serve, args=(app_module, kind, ports), daemon=True)
+        server.start()
+        try:
+            port = ports.get(timeout=30)
+            time.sleep(0.5)  # let the server start accepting
+            latencies, errors, elapsed = asyncio.run(_load_clients(port, route, clients, seconds, slow_seconds))
+        finally:
+            server.terminate()
+            server.join()
+        results[kind] = {
+            "clients": clients,
+            "seconds": seconds,
+            "slow_seconds": slow_seconds,
+            "errors": errors,
+            "requests_per_second": round(len(latencies) / elapsed, 1),  # requests in flight at the deadline finish
+            **(summarize(latencies) if latencies else {"runs": 0}),
+        }
+    return results
+
+
+def run(enrollments, data_dir=None, repeat=5, page_size=100, max_workers=8, concurrency=0, concurrency_seconds=5,
+        clients=0, slow_seconds=0.0):
+    """Run the whole suite and return the results as a JSON-serializable dict."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        scale = None
+        if data_dir is None:
+            data_dir = os.path.join(work_dir, "csv")
+            scale = generate_data.generate(data_dir, enrollments)
+        app_module = load_app_module(f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+        results = {
+            "scale": scale or {"data_dir": data_dir},
+            "python": sys.version.split()[0],
+            "load_data": bench_load(app_module, data_dir),
+            "endpoints": bench_endpoints(app_module, repeat),
+            "etl": bench_etl(app_module, page_size, max_workers),
+        }
+        if concurrency:
+            results["concurrent_reads"] = {
+                profile: bench_concurrent_reads(data_dir, work_dir, profile, concurrency, concurrency_seconds)
+                for profile in ("default", "production")
+            }
+        if clients:
+            results["servers"] = bench_servers(data_dir, work_dir, clients, concurrency_seconds, slow_seconds)
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark load_data, the API endpoints and the D_part2 ETL.")
+    parser.add_argument("--enrollments", type=int, default=10000, help="size of the generated dataset")
+    parser.add_argument("--data-dir", help="benchmark these CSVs instead of generating a dataset")
+    parser.add_argument("--repeat", type=int, default=5, help="requests per endpoint")
+    parser.add_argument("--page-size", type=int, default=100, help="page size used by the ETL")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent ETL page requests")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="also compare read throughput of the default and production engine "
+                             "profiles with this many reader processes")
+    parser.add_argument("--concurrency-seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=0,
+                        help="also load test the WSGI and ASGI (needs uvicorn) servers with this many "
+                             "concurrent connections for --concurrency-seconds")
+    parser.add_argument("--slow-seconds", type=float, default=0.0,
+                        help="time each load test client spends sending its request headers")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(args.enrollments, args.data_dir, args.repeat, args.page_size, args.workers,
+                  args.concurrency, args.concurrency_seconds, args.clients, args.slow_seconds)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,115 @@
+import argparse
+import csv
+import os
+import random
+
+# Shape of a generated university, relative to the number of enrollments
+STUDENT_RATIO = 8  # enrollments per student
+SECTION_RATIO = 40  # enrollments per section
+TERMS = [("Fall", 2022), ("Spring", 2023), ("Summer", 2023), ("Fall", 2023), ("Spring", 2024)]
+SECTIONS_PER_COURSE_TERM = 2
+COURSES_PER_DEPARTMENT = 50
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SLOT_TIMES = [("9:00", "11:00"), ("11:00", "1:00"), ("1:00", "3:00"), ("3:00", "5:00")]
+GRADES = ["A", "B", "C", "NC", ""]
+FIRST_NAMES = ["John", "Jane", "Peter", "Maya", "Ivan", "Julia", "Karim", "Holly", "Suresh", "Ying", "Boris", "Molly"]
+LAST_NAMES = ["Smith", "Doe", "Lynch", "Chen", "Petrov", "Rodriguez", "Zheng", "Bloom", "Verma", "Abdul", "Liu"]
+
+
+def scale_for(enrollments):
+    """Row counts of every table for a dataset with `enrollments` takes rows."""
+    students = max(1, enrollments // STUDENT_RATIO)
+    per_student = -(-enrollments // students)  # ceil
+    sections = max(per_student, enrollments // SECTION_RATIO, len(TERMS) * SECTIONS_PER_COURSE_TERM)
+    courses = max(1, -(-sections // (len(TERMS) * SECTIONS_PER_COURSE_TERM)))
+    return {
+        "enrollments": enrollments,
+        "students": students,
+        "sections": sections,
+        "courses": courses,
+        "instructors": max(1, courses // 2),
+        "departments": max(5, courses // COURSES_PER_DEPARTMENT),
+        "classrooms": max(5, sections // (len(TERMS) * len(DAYS) * len(SLOT_TIMES))),
+    }
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def section_key(index, courses):
+    """(course_id, sec_id, semester, year) of the index-th generated section."""
+    course = index % courses
+    term, sec_no = divmod(index // courses, SECTIONS_PER_COURSE_TERM)
+    semester, year = TERMS[term % len(TERMS)]
+    return f"C{course:06d}", sec_no + 1 + SECTIONS_PER_COURSE_TERM * (term // len(TERMS)), semester, year
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def generate(out_dir, enrollments, seed=0):
+    """Write a referentially consistent set of university CSVs to `out_dir`.
+
+    Rows are streamed to disk, so 10^7 enrollments do not need 10^7 rows in memory.
+    Returns the scale that was generated.
+    """
+    rng = random.Random(seed)
+    scale = scale_for(enrollments)
+    os.makedirs(out_dir, exist_ok=True)
+    path = lambda name: os.path.join(out_dir, name)
+
+    departments = [f"Dept{i:04d}" for i in range(scale["departments"])]
+    buildings = [f"Hall{i:03d}" for i in range(max(1, scale["classrooms"] // 10))]
+    classrooms = [(buildings[i % len(buildings)], str(100 + i)) for i in range(scale["classrooms"])]
+    student_ids = range(100000, 100000 + scale["students"])
+    instructor_ids = range(10000, 10000 + scale["instructors"])
+    slot_count = len(DAYS) * len(SLOT_TIMES)
+
+    write_csv(path("department.csv"), ["dept_name", "building", "budget"],
+              ((name, rng.choice(buildings), rng.randrange(100000, 5000000)) for name in departments))
+    write_csv(path("classroom.csv"), ["building", "room_no", "capacity"],
+              ((building, room, rng.choice([20, 30, 55, 60, 80, 100, 200])) for building, room in classrooms))
+    write_csv(path("time_slot.csv"), ["time_slot_id", "day", "start_time", "end_time"],
+              ((i + 1, DAYS[i // len(SLOT_TIMES)], *SLOT_TIMES[i % len(SLOT_TIMES)]) for i in range(slot_count)))
+    write_csv(path("student.csv"), ["ID", "name", "dept_name", "tot_cred"],
+              ((sid, person_name(rng), rng.choice(departments), rng.randrange(0, 130)) for sid in student_ids))
+    write_csv(path("instructor.csv"), ["ID", "name", "dept_name", "salary"],
+              ((iid, person_name(rng), rng.choice(departments), rng.randrange(60000, 250000)) for iid in instructor_ids))
+    write_csv(path("course.csv"), ["course_id", "title", "dept_name", "credits"],
+              ((f"C{i:06d}", f"Course {i}", departments[i % len(departments)], rng.choice([0.5, 1, 1, 1.5, 2]))
+               for i in range(scale["courses"])))
+    # Prerequisites only point at lower-numbered courses, so the graph stays acyclic
+    write_csv(path("prereq.csv"), ["course_id", "prerq_id"],
+              ((f"C{i:06d}", f"C{p:06d}") for i in range(1, scale["courses"])
+               for p in sorted(set(rng.randrange(i) for _ in range(rng.randrange(3))))))
+    write_csv(path("advisor.csv"), ["s_id", "i_id"],
+              ((sid, rng.choice(instructor_ids)) for sid in student_ids))
+
+    sections = [section_key(i, scale["courses"]) for i in range(scale["sections"])]
+    write_csv(path("section.csv"), ["course_id", "sec_id", "semester", "year", "building", "room_no", "time_slot_id"],
+              ((*key, *classrooms[i % len(classrooms)], rng.randrange(slot_count) + 1) for i, key in enumerate(sections)))
+    write_csv(path("teaches.csv"), ["ID", "course_id", "sec_id", "semester", "year"],
+              ((rng.choice(instructor_ids), *key) for key in sections))
+
+    def takes_rows():
+        base, extra = divmod(enrollments, scale["students"])
+        for i, sid in enumerate(student_ids):
+            for index in rng.sample(range(len(sections)), base + (1 if i < extra else 0)):
+                yield (sid, *sections[index], rng.choice(GRADES))
+
+    write_csv(path("takes.csv"), ["ID", "course_id", "sec_id", "semester", "year", "grade"], takes_rows())
+    return scale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic university dataset in the CSV schemas.")
+    parser.add_argument("out_dir", help="directory to write the CSV files to")
+    parser.add_argument("--enrollments", type=int, default=1000, help="number of takes rows (10^3 to 10^7)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.out_dir, args.enrollments, args.seed))
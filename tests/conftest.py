@@ -0,0 +1,56 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The API module (its file name has spaces, so it is loaded by path) on a scratch database."""
+    database = tmp_path_factory.mktemp('db') / 'university_schema.db'
+    os.environ['UNIVERSITY_DATABASE_URI'] = f'sqlite:///{database}'
+    spec = importlib.util.spec_from_file_location('app1', os.path.join(ROOT, 'app1 Final submission copy.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['app1'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A copy of the shipped CSVs that a test may edit."""
+    for file_name in os.listdir(ROOT):
+        if file_name.endswith('.csv'):
+            shutil.copy(os.path.join(ROOT, file_name), tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def app1(app_module, data_dir):
+    """The API module with fresh tables loaded from `data_dir`."""
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+        app_module.load_data(str(data_dir))
+        yield app_module
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def client(app1):
+    return app1.app.test_client()
+
+
+@pytest.fixture
+def sql(app1):
+    """Run one SQL statement on the test database and return all its rows."""
+    def run(statement, parameters=()):
+        with app1.db.engine.begin() as conn:
+            result = conn.exec_driver_sql(statement, parameters)
+            return result.fetchall() if result.returns_rows else None
+    return run
@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+
+def asgi_request(app1, method, path, body_chunks=(), headers=(), query_string=b''):
+    """Send one request through asgi_app; returns (status, headers, body)."""
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in body_chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query_string,
+             "http_version": "1.1", "headers": list(headers), "server": ("127.0.0.1", 8000)}
+    asyncio.run(app1.asgi_app(scope, receive, send))
+    start = sent[0]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+def test_asgi_serves_the_same_bodies_as_wsgi(app1, client):
+    status, _, body = asgi_request(app1, "GET", "/students", query_string=b"page=1&page_size=3")
+    assert status == 200
+    assert json.loads(body) == client.get('/students?page=1&page_size=3').get_json()
+
+
+def test_asgi_reads_chunked_request_bodies(app1, sql):
+    student_id, course_id, sec_id, semester, year = sql(
+        "SELECT student_id, course_id, sec_id, semester, year FROM takes LIMIT 1")[0]
+    payload = json.dumps([{"student_id": student_id, "course_id": course_id, "section_id": sec_id,
+                           "semester": semester, "year": year}]).encode()
+    status, _, body = asgi_request(
+        app1, "POST", "/takes", body_chunks=[payload[:10], payload[10:]],
+        headers=[(b"content-type", b"application/json"), (b"transfer-encoding", b"chunked")],
+    )
+    assert status == 200
+    assert json.loads(body)["data"]["records"] == [{"index": 0, "status": "error", "error": "already exists"}]
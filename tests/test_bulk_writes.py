@@ -0,0 +1,71 @@
+import csv
+
+
+def take(student_id, section, grade=None):
+    course_id, sec_id, semester, year = section
+    row = {"student_id": student_id, "course_id": course_id, "section_id": sec_id,
+           "semester": semester, "year": year}
+    if grade is not None:
+        row["grade"] = grade
+    return row
+
+
+def free_enrollment(sql):
+    """A (student, section) pair that takes.csv does not contain."""
+    return sql(
+        "SELECT student.id, section.course_id, section.sec_id, section.semester, section.year "
+        "FROM student, section WHERE NOT EXISTS (SELECT 1 FROM takes WHERE takes.student_id = student.id "
+        "AND takes.course_id = section.course_id AND takes.sec_id = section.sec_id "
+        "AND takes.semester = section.semester AND takes.year = section.year) "
+        "ORDER BY student.id, section.course_id LIMIT 2"
+    )
+
+
+def append_take(data_dir, row):
+    with open(data_dir / 'takes.csv', 'a', newline='') as f:
+        csv.writer(f).writerow(row)
+
+
+def test_post_validates_rows_and_is_atomic(client, sql):
+    (student_id, *section), _ = free_enrollment(sql)
+    body = [take(student_id, section, 'A'), take(999999999, section), take(student_id, ('NOPE', 1, 'Fall', 2020))]
+    data = client.post('/takes', json=body).get_json()
+    assert data["code"] == 0
+    assert [record["status"] for record in data["data"]["records"]] == ["skipped", "error", "error"]
+    assert [record.get("error") for record in data["data"]["records"]][1:] == ["unknown student", "unknown section"]
+    assert sql("SELECT count(*) FROM takes WHERE student_id = ? AND course_id = ?", (student_id, section[0])) == [(0,)]
+
+    data = client.post('/takes?atomic=0', json={"records": body}).get_json()
+    assert data["code"] == 1 and data["data"]["created"] == 1 and data["data"]["error"] == 2
+    data = client.post('/takes', json=body[:1]).get_json()
+    assert data["data"]["records"] == [{"index": 0, "status": "error", "error": "already exists"}]
+
+
+def test_patch_updates_only_given_fields(client, sql):
+    student_id, course_id, sec_id, semester, year, grade = sql("SELECT * FROM takes WHERE grade = 'A' LIMIT 1")[0][:6]
+    section = (course_id, sec_id, semester, year)
+    assert client.patch('/takes', json=[take(student_id, section, 'C')]).get_json()["data"]["updated"] == 1
+    assert client.patch('/takes', json=[take(student_id, section, 'C')]).get_json()["data"]["unchanged"] == 1
+    assert client.patch('/takes', json=[take(student_id, section)]).get_json()["data"]["unchanged"] == 1
+    assert sql("SELECT grade FROM takes WHERE student_id = ? AND course_id = ? AND sec_id = ?",
+               (student_id, course_id, sec_id)) == [('C',)]
+
+
+def test_bulk_written_rows_survive_a_csv_reload(app1, client, sql, data_dir):
+    (student_id, *section), (other_id, *other_section) = free_enrollment(sql)
+    assert client.post('/takes', json=[take(student_id, section, 'B')]).get_json()["data"]["created"] == 1
+    patched = sql("SELECT student_id, course_id, sec_id, semester, year FROM takes "
+                  "WHERE origin = 'csv' AND grade = 'A' LIMIT 1")[0]
+    assert client.patch('/takes', json=[take(patched[0], patched[1:], 'C')]).get_json()["data"]["updated"] == 1
+    version = client.get('/students?since=0').get_json()["data"]["version"]
+
+    # An unrelated change to the CSV must not undo the API's writes
+    append_take(data_dir, [other_id, *other_section, 'A'])
+    app1.load_data(str(data_dir), changed_only=True)
+
+    assert sql("SELECT grade, origin FROM takes WHERE student_id = ? AND course_id = ? AND sec_id = ? "
+               "AND semester = ? AND year = ?", (student_id, *section)) == [('B', 'api')]
+    assert sql("SELECT grade FROM takes WHERE student_id = ? AND course_id = ? AND sec_id = ? "
+               "AND semester = ? AND year = ?", tuple(patched)) == [('C',)]
+    assert sql("SELECT count(*) FROM takes WHERE student_id = ?", (other_id,))[0][0] >= 1
+    assert client.get(f'/deletions?since={version}').get_json()["data"]["records"] == []
@@ -0,0 +1,38 @@
+def since(client, path, version):
+    return client.get(f'{path}?since={version}').get_json()["data"]["records"]
+
+
+def current_version(client):
+    return client.get('/students?since=0').get_json()["data"]["version"]
+
+
+def test_teaches_changes_restamp_the_instructor(client, sql):
+    instructor_id, course_id, sec_id, semester, year = sql(
+        "SELECT instructor.id, section.course_id, section.sec_id, section.semester, section.year "
+        "FROM instructor, section WHERE NOT EXISTS (SELECT 1 FROM teaches WHERE teaches.instructor_id = instructor.id "
+        "AND teaches.course_id = section.course_id AND teaches.sec_id = section.sec_id "
+        "AND teaches.semester = section.semester AND teaches.year = section.year) LIMIT 1"
+    )[0]
+    version = current_version(client)
+    created = client.post('/teaches', json=[{"instructor_id": instructor_id, "course_id": course_id,
+                                             "section_id": sec_id, "semester": semester, "year": year}])
+    assert created.get_json()["data"]["created"] == 1
+    assert [record["id"] for record in since(client, '/instructors', version)] == [instructor_id]
+    assert course_id in [record["course_id"] for record in since(client, '/courses', version)]
+
+
+def test_renames_restamp_the_advisor_rows_embedding_them(app1, client, sql):
+    s_id, i_id = sql("SELECT s_id, i_id FROM advisor LIMIT 1")[0]
+    version = current_version(client)
+    app1.db.session.get(app1.Student, s_id).name = "Renamed Student"
+    app1.db.session.commit()
+    advisors = since(client, '/advisors', version)
+    assert {"student_id": s_id, "student_name": "Renamed Student"}.items() <= advisors[0].items()
+    assert all(record["student_id"] == s_id for record in advisors)
+
+    version = current_version(client)
+    app1.db.session.get(app1.Instructor, i_id).name = "Renamed Instructor"
+    app1.db.session.commit()
+    advisors = since(client, '/advisors', version)
+    assert advisors and all(record["instructor_id"] == i_id for record in advisors)
+    assert {record["instructor_name"] for record in advisors} == {"Renamed Instructor"}
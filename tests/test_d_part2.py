@@ -0,0 +1,206 @@
+import threading
+import time
+
+import fakeredis
+import mongomock
+import pytest
+from mongomock.collection import Collection
+
+import D_part2
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class ClientSession:
+    """Stands in for requests.Session, sending D_part2's requests to the Flask test client."""
+
+    def __init__(self, client, after_get=None):
+        self.client = client
+        self.after_get = after_get
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, query_string=params)
+        with self.lock:
+            self.requests += 1
+            requests = self.requests
+        if self.after_get:
+            self.after_get(requests)
+        return FakeResponse(response.status_code, response.get_json())
+
+
+class StubSession:
+    """Serves pages from a function (endpoint, params) -> (status code, payload)."""
+
+    def __init__(self, respond):
+        self.respond = respond
+
+    def get(self, url, params=None):
+        return FakeResponse(*self.respond(url.rsplit('/', 1)[-1], params or {}))
+
+
+def page(records, **fields):
+    return 200, {"code": 1, "msg": "Success", "data": {**fields, "records": records}}
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    # mongomock has no bulk_write for ReplaceOne batches
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+    monkeypatch.setattr(Collection, 'bulk_write', bulk_write, raising=False)
+    return fakeredis.FakeStrictRedis(decode_responses=True), mongomock.MongoClient()['university']
+
+
+@pytest.mark.parametrize('failure', [
+    (500, {}),
+    (200, {"code": 0, "msg": "Error", "error": "boom", "data": {"total": 0, "records": []}}),
+])
+def test_a_failed_page_raises(failure):
+    def respond(endpoint, params):
+        if params["page"] == 2:
+            return failure
+        return page([{"id": params["page"]}], total=6)
+
+    with pytest.raises(RuntimeError):
+        D_part2.fetch_data('students', page_size=1, session=StubSession(respond), base_url='')
+
+
+def test_a_failed_page_fails_the_sync(monkeypatch, stores):
+    def respond(endpoint, params):
+        if endpoint == 'deletions':
+            return page([], version=9)
+        if endpoint == 'students' and params["cursor"]:
+            return 200, {"code": 0, "msg": "Error", "error": "boom"}
+        return page([{D_part2.RECORD_KEY_FIELDS[endpoint]: 1}], next_cursor=None if params["cursor"] else "next")
+
+    monkeypatch.setattr(D_part2, 'make_session', lambda *args: StubSession(respond))
+    with pytest.raises(RuntimeError, match="boom"):
+        D_part2.sync_stores(*stores, since=3)
+
+
+@pytest.mark.parametrize('page_size', [3, 7])
+def test_concurrent_pages_come_back_in_order(client, sql, page_size):
+    ids = [row[0] for row in sql("SELECT id FROM student ORDER BY id")]
+    assert len(ids) % page_size  # the last page is a partial one
+
+    pages = list(D_part2.iter_pages('students', page_size, 4, ClientSession(client), ''))
+    assert [len(records) for records in pages[:-1]] == [page_size] * (len(pages) - 1)
+    assert [record["id"] for records in pages for record in records] == ids
+
+
+def test_incremental_pulls_skip_nothing_when_rows_are_deleted_meanwhile(app1, client, sql):
+    ids = [row[0] for row in sql("SELECT id FROM student ORDER BY id")]
+
+    def delete_first_student(requests):
+        if requests == 1:
+            with app1.db.engine.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM student WHERE id = ?", (ids[0],))
+
+    session = ClientSession(client, delete_first_student)
+    fetched = [record["id"] for records in D_part2.iter_cursor_pages('students', 2, session, '', {"since": 0})
+               for record in records]
+    assert fetched == ids
+
+
+def run_in_thread(function, timeout=10):
+    """Run `function` and return what it raised; fails the test if it does not finish."""
+    outcome = []
+
+    def target():
+        try:
+            function()
+            outcome.append(None)
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_pipeline hung"
+    return outcome[0]
+
+
+def test_a_sink_failing_after_its_input_ends_is_raised():
+    def write_at_the_end(records):
+        list(records)
+        raise ConnectionError("store down")
+
+    error = run_in_thread(lambda: D_part2.run_pipeline('t', iter([[1, 2], [3]]), {'redis': write_at_the_end}))
+    assert isinstance(error, RuntimeError) and "storing in redis failed: store down" in str(error)
+
+
+def test_a_sink_failing_midway_does_not_block_the_source():
+    def fail_at_once(records):
+        raise ConnectionError("store down")
+
+    pages = iter([[n] for n in range(50)])
+    error = run_in_thread(lambda: D_part2.run_pipeline('t', pages, {'redis': fail_at_once, 'mongodb': list},
+                                                       queue_size=1))
+    assert "storing in redis failed" in str(error)
+
+
+def test_a_failing_source_is_raised():
+    stored = []
+
+    def pages():
+        yield [1, 2]
+        raise RuntimeError("page 2 failed")
+
+    error = run_in_thread(lambda: D_part2.run_pipeline('t', pages(), {'redis': stored.extend}))
+    assert "t: fetching failed: page 2 failed" in str(error)
+    assert stored == [1, 2]
+
+
+def test_store_in_redis_writes_hashes_in_chunks(monkeypatch, stores):
+    redis_client, _ = stores
+    chunks = []
+    write_redis_chunk = D_part2.write_redis_chunk
+
+    def spy(redis_client, records, *args):
+        chunks.append([record["id"] for record in records])
+        write_redis_chunk(redis_client, records, *args)
+    monkeypatch.setattr(D_part2, 'write_redis_chunk', spy)
+
+    students = [{"id": n, "name": f"s{n}", "dept_name": "CompSci", "tot_cred": n * 10} for n in range(1, 6)]
+    D_part2.store_in_redis(redis_client, students + [{"id": None, "name": "no key"}], "students",
+                           chunk_size=2, ttl=60)
+
+    assert chunks == [[1, 2], [3, 4], [5]]
+    assert redis_client.hgetall("students:3") == {
+        "id": "3", "name": '"s3"', "dept_name": '"CompSci"', "tot_cred": "30",
+    }
+    assert D_part2.fetch_from_redis(redis_client, ["students:1", "students:9"]) == [students[0], None]
+    assert all(0 < redis_client.ttl(f"students:{n}") <= 60 for n in range(1, 6))
+    assert redis_client.smembers("idx:departments:CompSci:students") == {"1", "2", "3", "4", "5"}
+    assert redis_client.zscore("idx:students:tot_cred", "5") == 50
+
+
+def test_query_helpers_leave_out_expired_records(stores):
+    redis_client, _ = stores
+    D_part2.store_in_redis(redis_client, [{"id": 1, "dept_name": "CompSci", "tot_cred": 120}], "students", ttl=1)
+    D_part2.store_in_redis(redis_client, [{"id": 2, "dept_name": "CompSci", "tot_cred": 130}], "students")
+    D_part2.store_in_redis(redis_client, [
+        {"dept_name": "CompSci", "budget": 10, "instructors": [{"id": 7, "salary": 150000}]},
+    ], "departments", ttl=60)
+    time.sleep(1.1)  # student 1 expires, its index entries stay
+    assert D_part2.members_from_redis(redis_client, "CompSci", "students") == ["2"]
+    assert not D_part2.is_member_in_redis(redis_client, "CompSci", "students", "1")
+    assert D_part2.is_member_in_redis(redis_client, "CompSci", "students", "2")
+    assert D_part2.range_from_redis(redis_client, "students", "tot_cred", "(100") == [("2", 130.0)]
+    assert D_part2.instructors_by_salary_from_redis(redis_client, "(100000") == [("CompSci", "7", 150000.0)]
+
+    redis_client.delete("departments:CompSci")
+    assert D_part2.members_from_redis(redis_client, "CompSci", "instructors") == []
+    assert not D_part2.is_member_in_redis(redis_client, "CompSci", "instructors", "7")
+    assert D_part2.instructors_by_salary_from_redis(redis_client) == []
@@ -0,0 +1,82 @@
+import random
+
+
+def transitive_closure(edges):
+    requires = {}
+    for course_id, prereq_id in edges:
+        requires.setdefault(course_id, set()).add(prereq_id)
+    closure = set()
+    for course_id in requires:
+        stack = list(requires[course_id])
+        while stack:
+            prereq_id = stack.pop()
+            if (course_id, prereq_id) not in closure:
+                closure.add((course_id, prereq_id))
+                stack.extend(requires.get(prereq_id, ()))
+    return closure
+
+
+def test_incremental_prereq_closure_matches_a_full_recompute(app1, sql):
+    rng = random.Random(14)
+    courses = [course_id for (course_id,) in sql("SELECT course_id FROM course ORDER BY course_id")]
+    session = app1.db.session
+    for _ in range(15):
+        edges = app1.Prereq.query.all()
+        for edge in rng.sample(edges, min(len(edges), rng.randrange(3))):
+            session.delete(edge)
+        existing = {(edge.course_id, edge.prereq_id) for edge in edges}
+        for _ in range(rng.randrange(4)):
+            edge = tuple(rng.sample(courses, 2))  # cycles included
+            if edge not in existing:
+                existing.add(edge)
+                session.add(app1.Prereq(course_id=edge[0], prereq_id=edge[1]))
+        session.commit()
+
+        assert set(sql("SELECT course_id, prereq_id FROM prereq_closure")) == \
+            transitive_closure(sql("SELECT course_id, prereq_id FROM prereq"))
+
+
+def expected_summaries(app1, sql):
+    credits = dict(sql("SELECT course_id, credits FROM course"))
+    grades, enrollment = {}, {}
+    for student_id, course_id, sec_id, semester, year, grade in sql(
+            "SELECT student_id, course_id, sec_id, semester, year, grade FROM takes"):
+        section = (course_id, sec_id, semester, year)
+        enrollment[section] = enrollment.get(section, 0) + 1
+        if grade in app1.GRADE_POINTS:
+            graded, total_credits, points = grades.get(student_id, (0, 0, 0))
+            grades[student_id] = (graded + 1, total_credits + credits[course_id],
+                                  points + app1.GRADE_POINTS[grade] * credits[course_id])
+    return grades, enrollment
+
+
+def test_incremental_takes_summaries_match_a_full_recompute(app1, sql):
+    rng = random.Random(16)
+    students = [student_id for (student_id,) in sql("SELECT id FROM student")]
+    sections = sql("SELECT course_id, sec_id, semester, year FROM section")
+    session = app1.db.session
+    for _ in range(15):
+        takes = app1.Takes.query.all()
+        for take in rng.sample(takes, min(len(takes), rng.randrange(3))):
+            session.delete(take)
+        for take in rng.sample(takes, min(len(takes), rng.randrange(3))):
+            if take not in session.deleted:
+                take.grade = rng.choice([None, 'A', 'B', 'F', 'W'])
+        existing = {(take.student_id, take.course_id, take.sec_id, take.semester, take.year) for take in takes}
+        for _ in range(rng.randrange(4)):
+            key = (rng.choice(students), *rng.choice(sections))
+            if key not in existing:
+                existing.add(key)
+                session.add(app1.Takes(student_id=key[0], course_id=key[1], sec_id=key[2], semester=key[3],
+                                       year=key[4], grade=rng.choice([None, 'A', 'C', 'D'])))
+        if rng.random() < 0.3:
+            rng.choice(app1.Course.query.all()).credits = rng.choice([0.5, 1, 1.5, 2])
+        session.commit()
+
+        grades, enrollment = expected_summaries(app1, sql)
+        assert {student_id: (graded, round(total_credits, 6), round(points, 6))
+                for student_id, graded, total_credits, points in sql("SELECT * FROM student_grades")} == \
+            {student_id: (graded, round(total_credits, 6), round(points, 6))
+             for student_id, (graded, total_credits, points) in grades.items()}
+        assert {tuple(row[:4]): row[4] for row in sql(
+            "SELECT course_id, sec_id, semester, year, enrolled FROM section_enrollment")} == enrollment
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize('route, key_query, key_fields', [
+    ('/students', "SELECT id FROM student ORDER BY id DESC LIMIT 2", ['id']),
+    ('/analytics/gpa', "SELECT student_id FROM student_grades ORDER BY student_id DESC LIMIT 1", ['id']),
+    ('/analytics/enrollment',
+     "SELECT course_id, sec_id, semester, year FROM section ORDER BY course_id DESC LIMIT 2",
+     ['course_id', 'sec_id', 'semester', 'year']),
+])
+def test_ids_returns_only_the_requested_records(client, sql, route, key_query, key_fields):
+    keys = sql(key_query)
+    ids = ','.join(':'.join(str(part) for part in key) for key in keys)
+    data = client.get(route, query_string={"ids": ids}).get_json()["data"]
+    assert data["total"] == len(keys)
+    assert sorted(tuple(record[field] for field in key_fields) for record in data["records"]) == sorted(keys)
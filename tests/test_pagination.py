@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize('route, arguments, error', [
+    ('/students', {"page_size": 0}, "page_size must be at least 1"),
+    ('/students', {"page": 0}, "page must be at least 1"),
+    ('/students', {"page": -1, "page_size": 5}, "page must be at least 1"),
+    ('/students', {"page_size": "ten"}, "page_size must be a whole number"),
+    ('/students', {"cursor": "", "page_size": 0}, "page_size must be at least 1"),
+    ('/search', {"q": "data", "page_size": 0}, "page_size must be at least 1"),
+    ('/search', {"q": "data", "page": 0}, "page must be at least 1"),
+])
+def test_page_arguments_below_one_are_rejected(client, route, arguments, error):
+    data = client.get(route, query_string=arguments).get_json()
+    assert data["code"] == 0 and data["error"] == error
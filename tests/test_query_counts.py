@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def count_queries(app1):
+    """Call a function and return how many SQL statements it ran."""
+    def count(function):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(app1.db.engine, 'before_cursor_execute', record)
+        try:
+            function()
+        finally:
+            event.remove(app1.db.engine, 'before_cursor_execute', record)
+        return len(statements)
+    return count
+
+
+# The data version, the page, then one query per eager-loaded relationship
+@pytest.mark.parametrize('path, queries', [
+    ('/departments', 4),
+    ('/students', 3),
+    ('/courses', 4),
+    ('/advisors', 2),
+])
+def test_query_count_does_not_grow_with_the_page(client, count_queries, path, queries):
+    client.get(f'{path}?page=1&page_size=1')  # fills the cached table count
+    counts = []
+    for page_size in (2, 8):
+        def get():
+            assert client.get(f'{path}?page=1&page_size={page_size}').get_json()["code"] == 1
+        counts.append(count_queries(get))
+    assert counts == [queries, queries]
@@ -0,0 +1,6 @@
+def test_every_get_route_is_planned_without_unexpected_full_scans(app1):
+    report = app1.explain_endpoints()
+    planned = {route.split('?')[0] for route, _, _, _ in report}
+    course_id = app1.db.session.execute(app1.db.text("SELECT min(course_id) FROM prereq")).scalar()
+    assert {f'/courses/{course_id}/prerequisites', '/schedule/check', '/search', '/students'} <= planned
+    assert [(route, scans) for route, _, _, scans in report if scans] == []
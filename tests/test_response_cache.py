@@ -0,0 +1,26 @@
+def write_from_another_process(app1, statement, parameters=()):
+    """Commit a change the way another worker would: new row version, no local cache invalidation."""
+    with app1.db.engine.begin() as conn:
+        version = app1.next_row_version(conn)
+        conn.exec_driver_sql(statement.replace(':version', str(version)), parameters)
+
+
+def test_cached_responses_follow_writes_of_other_processes(app1, client):
+    first = client.get('/students?ids=1238')
+    assert first.get_json()["data"]["records"][0]["name"] != "Renamed"
+    etag = first.headers["ETag"]
+    assert client.get('/students?ids=1238', headers={"If-None-Match": etag}).status_code == 304
+
+    write_from_another_process(app1, "UPDATE student SET name = 'Renamed', row_version = :version WHERE id = 1238")
+
+    fresh = client.get('/students?ids=1238', headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.get_json()["data"]["records"][0]["name"] == "Renamed"
+
+
+def test_cached_counts_follow_writes_of_other_processes(app1, client):
+    total = client.get('/students?page=1&page_size=2').get_json()["data"]["total"]
+    write_from_another_process(app1, "DELETE FROM advisor WHERE s_id = 1238")
+    write_from_another_process(app1, "DELETE FROM takes WHERE student_id = 1238")
+    write_from_another_process(app1, "DELETE FROM student WHERE id = 1238")
+    assert client.get('/students?page=1&page_size=2').get_json()["data"]["total"] == total - 1